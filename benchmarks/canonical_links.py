@@ -0,0 +1,70 @@
+'''Measures joining the links of a page with its url, comparing the previous
+scraper (urljoin and a fragment search per link) against the batch
+utils.canonical.canonicalize_links, and counts how many distinct urls each
+leaves for the frontier.
+
+    python -m benchmarks.canonical_links --pages 2000
+'''
+import time
+import random
+
+from argparse import ArgumentParser
+from urllib.parse import urljoin
+
+from utils.canonical import canonicalize_links
+
+PAGE_URL = "https://www.ics.uci.edu/community/news/view_news.php"
+
+LINK_FORMS = (
+    "/community/news/view_news?id={n}",
+    "view_news.php?id={n}#top",
+    "https://www.ics.uci.edu/community/news/view_news.php?id={n}",
+    "HTTPS://WWW.ICS.UCI.EDU:443/community/news/view_news.php?id={n}",
+    "./view_news.php?utm_source=feed&id={n}",
+    "../news/view_news.php?id={n}&utm_medium=email",
+    "/faculty/profiles/view_faculty.php?ucinetid={n}",
+    "//www.cs.uci.edu/events/{n}/",
+    "mailto:someone{n}@uci.edu",
+    "#section{n}")
+
+
+def synthetic_pages(count, links_per_page=150, seed=0):
+    rand = random.Random(seed)
+    return [
+        [rand.choice(LINK_FORMS).format(n=rand.randint(0, 200)) for _ in range(links_per_page)]
+        for _ in range(count)]
+
+
+def previous_links(url, hrefs):
+    links = []
+    for link in hrefs:
+        if link != "#" and link != "/":
+            new_url = urljoin(url, link)
+            fragment_index = new_url.find('#')
+            if fragment_index != -1:
+                new_url = new_url[:fragment_index]
+            links.append(new_url)
+    return links
+
+
+def run(name, join, pages):
+    start = time.process_time()
+    distinct = set()
+    for hrefs in pages:
+        distinct.update(join(PAGE_URL, hrefs))
+    elapsed = time.process_time() - start
+    print(f"{name:<20} {elapsed / len(pages) * 1000:8.3f} ms CPU per page "
+          f"{len(distinct):8d} distinct urls")
+
+
+def main(count):
+    pages = synthetic_pages(count)
+    run("urljoin per link", previous_links, pages)
+    run("canonicalize_links", canonicalize_links, pages)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.pages)
@@ -0,0 +1,156 @@
+'''Runs the threaded Crawler end to end against utils.replay_server for several
+THREADCOUNT values and reports pages per second, p50/p99 fetch and parse
+latency, from utils.metrics, and peak RSS. Each crawl runs in its own
+process, so its peak RSS is its own. The archive is a page cache recorded
+with launch.py --record, or, without --archive, a synthetic site of --pages
+linked pages.
+
+    python -m benchmarks.crawl --threads 1,4,8 --latency 0.02
+    python -m benchmarks.crawl --archive pages --seed https://www.ics.uci.edu
+'''
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import resource
+import tempfile
+import subprocess
+import requests
+import cbor
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from utils.page_cache import PageCache
+from utils.replay_server import ReplayServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOSTS = (
+    "www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu",
+    "vision.ics.uci.edu", "wics.ics.uci.edu", "sdcl.ics.uci.edu", "mlphysics.ics.uci.edu")
+LETTERS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiou"
+
+
+def word(n):
+    '''A pronounceable word for every number, so urls and text have no digits
+    for the trap patterns to fold together.'''
+    syllables = []
+    while True:
+        n, syllable = divmod(n, len(LETTERS) * len(VOWELS))
+        syllables.append(LETTERS[syllable // len(VOWELS)] + VOWELS[syllable % len(VOWELS)])
+        if not n:
+            return "".join(syllables)
+
+
+def synthetic_archive(path, pages, links_per_page=30, words_per_page=400, seed=0):
+    '''Records a site of `pages` html pages spread over HOSTS, each linking to
+    the next one and to links_per_page random others, and returns the url of
+    the first page.'''
+    rand = random.Random(seed)
+    urls = [f"https://{HOSTS[i % len(HOSTS)]}/{word(i)}/{word(i * 7 + 3)}" for i in range(pages)]
+    vocabulary = [word(n) for n in range(5000)]
+    archive = PageCache(path)
+    for i, url in enumerate(urls):
+        links = [urls[(i + 1) % pages]] + rand.sample(urls, min(links_per_page, pages))
+        text = " ".join(rand.choices(vocabulary, k=words_per_page))
+        raw = requests.Response()
+        raw.status_code = 200
+        raw.url = url
+        raw.headers["Content-Type"] = "text/html; charset=utf-8"
+        raw._content = (
+            f"<html><head><title>{word(i)}</title></head><body><p>{text}</p>"
+            + "".join(f'<a href="{link}">{word(n)}</a>' for n, link in enumerate(links))
+            + "</body></html>").encode("utf-8")
+        archive.put(url, 200, cbor.dumps({"url": url, "status": 200, "response": pickle.dumps(raw)}))
+    archive.close()
+    return urls[0]
+
+
+def crawl(threads, cache_server, seed, politeness):
+    '''Runs one crawl in this process, from the working directory, and
+    returns its measurements.'''
+    from crawler import Crawler
+    from utils.config import Config
+    from utils.metrics import metrics
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["IDENTIFICATION"]["USERAGENT"] = "IR benchmark"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.shelve"
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(threads)
+    cparser["LOCAL PROPERTIES"]["PAGE_CACHE"] = ""
+    cparser["LOCAL PROPERTIES"]["STATS_INTERVAL"] = "0"
+    cparser["CRAWLER"]["SEEDURL"] = seed
+    cparser["CRAWLER"]["POLITENESS"] = str(politeness)
+    config = Config(cparser)
+    host, _, port = cache_server.rpartition(":")
+    config.cache_server = (host, int(port))
+
+    start = time.perf_counter()
+    Crawler(config, True).start()
+    elapsed = time.perf_counter() - start
+    timers = metrics.snapshot()["timers"]
+    fetch, parse = timers.get("download", {}), timers.get("parse", {})
+    return {
+        "threads": threads,
+        "pages": fetch.get("count", 0),
+        "seconds": elapsed,
+        "fetch_p50": fetch.get("p50", 0.0),
+        "fetch_p99": fetch.get("p99", 0.0),
+        "parse_p50": parse.get("p50", 0.0),
+        "parse_p99": parse.get("p99", 0.0),
+        # Kilobytes on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run(threads, cache_server, seed, politeness):
+    with tempfile.TemporaryDirectory() as workdir:
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.crawl", "--run", str(threads),
+             "--cache_server", cache_server, "--seed", seed, "--politeness", str(politeness)],
+            cwd=workdir, env=dict(os.environ, PYTHONPATH=ROOT),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True)
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    print(f"THREADCOUNT {result['threads']:3d} {result['pages']:6d} pages "
+          f"{result['pages'] / result['seconds']:8.1f} pages/s  "
+          f"fetch p50 {result['fetch_p50'] * 1000:7.1f} ms p99 {result['fetch_p99'] * 1000:7.1f} ms  "
+          f"parse p50 {result['parse_p50'] * 1000:6.1f} ms p99 {result['parse_p99'] * 1000:6.1f} ms  "
+          f"peak RSS {result['peak_rss_mb']:6.1f} MB")
+
+
+def main(thread_counts, archive, seed, pages, latency, jitter, politeness):
+    with tempfile.TemporaryDirectory() as tmp:
+        if archive is None:
+            archive = os.path.join(tmp, "archive")
+            seed = synthetic_archive(archive, pages)
+        replay = ReplayServer(archive, latency, jitter)
+        host, port = replay.start()
+        print(f"Replaying {len(replay.archive)} pages with {latency * 1000:.0f} ms latency.")
+        for threads in thread_counts:
+            run(threads, f"{host}:{port}", seed, politeness)
+        replay.stop()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=str, default="1,4,8")
+    parser.add_argument("--archive", type=str, default=None)
+    parser.add_argument("--seed", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--politeness", type=float, default=0.0)
+    # Internal: run one crawl and print its measurements.
+    parser.add_argument("--run", type=int, default=None)
+    parser.add_argument("--cache_server", type=str, default=None)
+    args = parser.parse_args()
+    if args.run is not None:
+        print(json.dumps(crawl(args.run, args.cache_server, args.seed, args.politeness)))
+    else:
+        if args.archive and not args.seed:
+            parser.error("--archive needs the --seed url the recorded crawl started from.")
+        main([int(threads) for threads in args.threads.split(",")],
+             args.archive, args.seed, args.pages, args.latency, args.jitter, args.politeness)
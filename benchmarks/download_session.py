@@ -0,0 +1,97 @@
+'''Downloads pages from a local stand-in for the cache server that answers
+with cbor encoded responses, comparing a new connection per request against
+the pooled per-thread session in utils.download. Every --fail_every-th
+request is answered with a 503 to check that it is retried.
+
+    python -m benchmarks.download_session --requests 500
+'''
+import time
+import pickle
+import logging
+import requests
+import cbor
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+
+from utils.download import download
+
+
+class StandInConfig(object):
+    def __init__(self, port):
+        self.cache_server = ("127.0.0.1", port)
+        self.user_agent = "IR benchmark"
+        self.connect_timeout = 5
+        self.read_timeout = 30
+        self.retries = 3
+        self.retry_backoff = 0
+        self.page_cache = ""
+
+
+def cbor_response(url):
+    raw = requests.Response()
+    raw.status_code = 200
+    raw.url = url
+    raw._content = f"<html><body><a href='{url}/next'>next</a></body></html>".encode("utf-8")
+    return cbor.dumps({"url": url, "status": 200, "response": pickle.dumps(raw)})
+
+
+def make_handler(fail_every):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        requests_seen = 0
+
+        def do_GET(self):
+            StandInHandler.requests_seen += 1
+            if fail_every and StandInHandler.requests_seen % fail_every == 0:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            url = parse_qs(urlparse(self.path).query)["q"][0]
+            body = cbor_response(url)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return StandInHandler
+
+
+def download_without_session(url, config):
+    host, port = config.cache_server
+    resp = requests.get(
+        f"http://{host}:{port}/",
+        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    return cbor.loads(resp.content)["status"] if resp else resp.status_code
+
+
+def run(name, fetch, count):
+    start = time.perf_counter()
+    statuses = [fetch(f"https://www.ics.uci.edu/page/{i}") for i in range(count)]
+    elapsed = time.perf_counter() - start
+    ok = statuses.count(200)
+    print(f"{name:<28} {elapsed / count * 1000:8.3f} ms per download, {ok}/{count} ok")
+
+
+def main(count, fail_every):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fail_every))
+    Thread(target=server.serve_forever, daemon=True).start()
+    config = StandInConfig(server.server_address[1])
+    logger = logging.getLogger("benchmark")
+    run("requests.get per url", lambda url: download_without_session(url, config), count)
+    run("pooled session + retries", lambda url: download(url, config, logger).status, count)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--fail_every", type=int, default=50)
+    args = parser.parse_args()
+    main(args.requests, args.fail_every)
@@ -0,0 +1,52 @@
+'''Compares add_url throughput of a shelve synced on every url against the
+batched ShelveStore used by the frontier.
+
+    python -m benchmarks.frontier_persistence --urls 20000
+'''
+import os
+import time
+import shelve
+import tempfile
+
+from argparse import ArgumentParser
+
+from utils import get_urlhash
+from crawler.storage import ShelveStore
+
+
+def synthetic_urls(count):
+    hosts = ["www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu"]
+    return [f"https://{hosts[i % len(hosts)]}/page/{i}" for i in range(count)]
+
+
+def add_urls(save, urls, sync):
+    for url in urls:
+        urlhash = get_urlhash(url)
+        if urlhash not in save:
+            save[urlhash] = (url, False)
+            if sync:
+                save.sync()
+
+
+def run(name, save, urls, sync):
+    start = time.perf_counter()
+    add_urls(save, urls, sync)
+    save.close()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.3f}s  {len(urls) / elapsed:12.0f} urls/s")
+
+
+def main(count, batch_size):
+    urls = synthetic_urls(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        run("shelve, sync per url", shelve.open(os.path.join(tmp, "sync")), urls, True)
+        run(f"ShelveStore, batch {batch_size}",
+            ShelveStore(os.path.join(tmp, "batched"), batch_size, 0), urls, False)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.urls, args.batch)
@@ -0,0 +1,125 @@
+'''Measures decoding the cache server's cbor payloads into utils.response
+Response objects, against only unpickling the requests.Response, to show what
+reading the content type costs, and the parse time the scraper saves on each
+page it skips because it is not html. Reports CPU time, the peak memory
+allocated while decoding a page and the memory held by each decoded response.
+
+    python -m benchmarks.response_decode --corpus path/to/recorded/cbor
+Every file in the corpus holds one raw cache server answer. Without --corpus,
+payloads are built the way the cache server builds them, every fifth one a
+pdf.
+'''
+import os
+import time
+import pickle
+import tracemalloc
+import requests
+import cbor
+
+import scraper
+
+from argparse import ArgumentParser
+from datetime import timedelta
+
+from utils.response import Response
+
+
+def unpickle(payload):
+    resp_dict = cbor.loads(payload)
+    return pickle.loads(resp_dict["response"])
+
+
+def decode(payload):
+    return Response(cbor.loads(payload)).raw_response
+
+
+def synthetic_payloads(count, size):
+    payloads = []
+    session = requests.Session()
+    for i in range(count):
+        url = f"https://www.ics.uci.edu/page/{i}"
+        raw = requests.Response()
+        raw.status_code = 200
+        raw.url = url
+        raw.reason = "OK"
+        raw.encoding = "utf-8"
+        raw.elapsed = timedelta(milliseconds=120)
+        pdf = i % 5 == 4
+        raw.headers.update({
+            "Content-Type": "application/pdf" if pdf else "text/html; charset=utf-8",
+            "Server": "Apache",
+            "Cache-Control": "max-age=600",
+            "Set-Cookie": f"session={i}; Path=/"})
+        raw.cookies.set("session", str(i), domain="www.ics.uci.edu", path="/")
+        raw.request = session.prepare_request(requests.Request("GET", url))
+        paragraphs = "".join(f"<p>Paragraph {j} of page {i}.</p>" for j in range(size // 30))
+        raw._content = f"<html><body>{paragraphs}</body></html>".encode("utf-8")
+        if pdf:
+            raw._content = b"%PDF-1.4\n" + bytes(range(256)) * (size // 256)
+        payloads.append(cbor.dumps({"url": url, "status": 200, "response": pickle.dumps(raw)}))
+    return payloads
+
+
+def load_corpus(path):
+    payloads = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as payload:
+            payloads.append(payload.read())
+    return payloads
+
+
+def run(name, decode, payloads, rounds):
+    for payload in payloads:
+        assert decode(payload).content == unpickle(payload).content
+    start = time.process_time()
+    for _ in range(rounds):
+        for payload in payloads:
+            decode(payload)
+    elapsed = time.process_time() - start
+    peak = 0
+    for payload in payloads:
+        tracemalloc.start()
+        decode(payload)
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    tracemalloc.start()
+    responses = [decode(payload) for payload in payloads]
+    kept = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_page = elapsed / (rounds * len(payloads)) * 1000000
+    print(f"{name:<16} {per_page:8.1f} us CPU per page "
+          f"{peak / len(payloads) / 1024:8.1f} KiB peak "
+          f"{kept / len(responses) / 1024:8.1f} KiB kept per response")
+
+
+def skipped_parse(payloads, rounds):
+    '''CPU time per page of parsing the pages is_html turns down.'''
+    skipped = [Response(cbor.loads(payload)) for payload in payloads]
+    skipped = [resp for resp in skipped if not scraper.is_html(resp)]
+    if not skipped:
+        print("No non-html pages to skip.")
+        return
+    start = time.process_time()
+    for _ in range(rounds):
+        for resp in skipped:
+            scraper.parse_page(resp.url, resp.raw_response.content)
+    elapsed = time.process_time() - start
+    print(f"{len(skipped)} non-html pages, skipping saves "
+          f"{elapsed / (rounds * len(skipped)) * 1000000:8.1f} us CPU per page")
+
+
+def main(corpus, count, size, rounds):
+    payloads = load_corpus(corpus) if corpus else synthetic_payloads(count, size)
+    run("unpickle", unpickle, payloads, rounds)
+    run("Response", decode, payloads, rounds)
+    skipped_parse(payloads, rounds)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--page_size", type=int, default=30000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.page_size, args.rounds)
@@ -0,0 +1,84 @@
+'''Measures the CPU time spent parsing one page, comparing the previous
+scraper (two lxml.html parses, a //p walk and a regex compiled per call)
+against the single-pass scraper.parse_page. Both join every link with the
+page url; parse_page also computes the SimHash fingerprint.
+
+    python -m benchmarks.scraper_parse --corpus path/to/saved/html
+Without --corpus, synthetic pages are generated.
+'''
+import os
+import re
+import time
+
+from argparse import ArgumentParser
+from lxml import html
+from urllib.parse import urljoin
+
+import scraper
+
+PAGE_URL = "https://www.ics.uci.edu/"
+
+
+def previous_parse(content):
+    # check_similarity
+    text = html.fromstring(content).text_content()
+    fingerprint = hash(text)
+    # extract_next_links
+    tree = html.fromstring(content)
+    text = tree.text_content()
+    links = [urljoin(PAGE_URL, link[2]).partition("#")[0] for link in tree.iterlinks()]
+    words = []
+    for body in tree.xpath('//p'):
+        for word in re.split('[^a-zA-z0-9]+', body.text_content()):
+            word = word.lower()
+            if len(word) > 1 and not word.isnumeric():
+                words.append(word)
+    return links, text, words, fingerprint
+
+
+def synthetic_pages(count):
+    pages = []
+    for i in range(count):
+        paragraphs = "".join(
+            f"<p>Paragraph {j} of page {i} with <b>some</b> words about research "
+            f"and teaching in the school number {j * i}.</p>"
+            for j in range(40))
+        anchors = "".join(f'<a href="/page/{i}/{j}">link {j}</a>' for j in range(100))
+        pages.append(
+            f"<html><head><title>Page {i}</title><script>var x = {i};</script></head>"
+            f"<body><div>{anchors}</div>{paragraphs}</body></html>".encode("utf-8"))
+    return pages
+
+
+def load_corpus(path):
+    pages = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as page:
+            pages.append(page.read())
+    return pages
+
+
+def run(name, parse, pages, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        for content in pages:
+            parse(content)
+    elapsed = time.process_time() - start
+    per_page = elapsed / (rounds * len(pages)) * 1000
+    print(f"{name:<24} {per_page:8.3f} ms CPU per page")
+
+
+def main(corpus, count, rounds):
+    pages = load_corpus(corpus) if corpus else synthetic_pages(count)
+    pages = [page for page in pages if page.strip()]
+    run("two parses + xpath", previous_parse, pages, rounds)
+    run("single pass", lambda content: scraper.parse_page(PAGE_URL, content), pages, rounds)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.rounds)
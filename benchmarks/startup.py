@@ -0,0 +1,68 @@
+'''Measures the startup steps that come before the first download: creating
+THREADCOUNT workers, and loading a saved frontier of --urls urls, a quarter
+of them still to be downloaded, from a shelve and a sqlite save file.
+
+    python -m benchmarks.startup --urls 200000 --threads 8
+'''
+import os
+import time
+import tempfile
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from utils import get_urlhash
+from utils.config import Config
+from crawler.storage import open_store
+from crawler.stats import CrawlStats
+from crawler.frontier import Frontier
+from crawler.worker import Worker
+
+HOSTS = ("www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu")
+
+
+def make_config(save_file, store, threads):
+    cparser = ConfigParser()
+    cparser.read(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini"))
+    cparser["IDENTIFICATION"]["USERAGENT"] = "IR benchmark"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = save_file
+    cparser["LOCAL PROPERTIES"]["STORE"] = store
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(threads)
+    cparser["LOCAL PROPERTIES"]["STATS_INTERVAL"] = "0"
+    return Config(cparser)
+
+
+def save_frontier(config, count):
+    save = open_store(config)
+    for i in range(count):
+        url = f"https://{HOSTS[i % len(HOSTS)]}/page/{i}"
+        save[get_urlhash(url)] = (url, i % 4 != 0, i % 7, float(i % 13))
+    save.close()
+
+
+def timed(name, function):
+    start = time.perf_counter()
+    result = function()
+    print(f"{name:<36} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def main(count, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(os.path.join(tmp, "frontier.shelve"), "shelve", threads)
+        stats = CrawlStats(config, True)
+        timed(f"create {threads} workers", lambda: [
+            Worker(worker_id, config, None, stats) for worker_id in range(threads)])
+        for store in ("shelve", "sqlite"):
+            config = make_config(os.path.join(tmp, f"frontier.{store}"), store, threads)
+            save_frontier(config, count)
+            frontier = timed(f"load {count} urls from {store}", lambda: Frontier(config, False))
+            frontier.save.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    main(args.urls, args.threads)
@@ -0,0 +1,90 @@
+'''Measures the time to filter urls, comparing the previous scraper.is_valid
+(a defaultdict, set literals and a regex per call) against the compiled
+utils.url_filter.UrlFilter, and checks that both take the same decisions.
+
+    python -m benchmarks.url_filter --urls 2000000
+'''
+import re
+import time
+import random
+
+from argparse import ArgumentParser
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from utils.url_filter import UrlFilter
+
+
+def previous_is_valid(url):
+    try:
+        parsed = urlparse(url)
+        if parsed.scheme not in set(["http", "https"]):
+            return False
+        path_count = defaultdict(int)
+        path_words = parsed.path.split("/")
+        for x in path_words:
+            path_count[x] += 1
+        for count in path_count.values():
+            if count > 1:
+                return False
+        split_netloc = parsed.netloc.split(".")
+        affiliate_index = split_netloc.index("uci")
+        if split_netloc[affiliate_index-1] not in set(["ics", "cs", "informatics", "stat"]):
+            return False
+        if split_netloc[affiliate_index+1] != "edu":
+            return False
+        return not re.match(
+            r".*\.(css|js|bmp|gif|jpe?g|ico"
+            + r"|png|tiff?|mid|mp2|mp3|mp4"
+            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+            + r"|epub|dll|cnf|tgz|sha1"
+            + r"|thmx|mso|arff|rtf|jar|csv"
+            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+HOSTS = (
+    "www.ics.uci.edu", "ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu",
+    "www.stat.uci.edu", "vision.ics.uci.edu", "wics.ics.uci.edu", "swiki.ics.uci.edu",
+    "www.ics.uci.edu:8080", "www.uci.edu", "www.eecs.uci.edu", "www.google.com",
+    "github.com", "uci.edu")
+SEGMENTS = ("people", "faculty", "research", "events", "2019", "page", "wiki", "doku.php", "~eppstein", "a")
+ENDINGS = ("", "", "", "", "/", ".html", ".php", ".pdf", ".PNG", ".jpeg", ".tar.gz", ".txt")
+
+
+def synthetic_urls(count, seed=0):
+    rand = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        scheme = rand.choice(("https", "https", "http", "mailto", "ftp"))
+        path = "/".join(rand.choice(SEGMENTS) for _ in range(rand.randint(0, 5)))
+        query = rand.choice(("", "", "?id=" + str(rand.randint(0, 999)), "?do=edit&rev=1"))
+        urls.append(f"{scheme}://{rand.choice(HOSTS)}/{path}{rand.choice(ENDINGS)}{query}")
+    return urls
+
+
+def run(name, is_valid, urls):
+    start = time.process_time()
+    decisions = [is_valid(url) for url in urls]
+    elapsed = time.process_time() - start
+    print(f"{name:<20} {elapsed / len(urls) * 1000000:8.3f} us CPU per url "
+          f"{sum(decisions):10d} valid")
+    return decisions
+
+
+def main(count):
+    urls = synthetic_urls(count)
+    previous = run("previous is_valid", previous_is_valid, urls)
+    compiled = run("UrlFilter", UrlFilter().is_valid, urls)
+    different = [url for url, old, new in zip(urls, previous, compiled) if old != new]
+    print(f"{len(different)} urls decided differently {different[:5]}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=2000000)
+    args = parser.parse_args()
+    main(args.urls)
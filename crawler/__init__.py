@@ -1,18 +1,28 @@
 from utils import get_logger
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.stats import CrawlStats
+from crawler.parse_pool import shutdown_parse_pool
+from utils.page_cache import close_page_caches
+from utils.metrics import start_metrics_server
+import scraper
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
         self.logger = get_logger("CRAWLER")
+        scraper.set_url_filter(config)
         self.frontier = frontier_factory(config, restart)
+        self.stats = CrawlStats(config, restart)
+        start_metrics_server(config)
+        if hasattr(self.frontier, "scorer"):
+            self.frontier.scorer.traps = self.stats.traps
         self.workers = list()
         self.worker_factory = worker_factory
 
     def start_async(self):
         self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier)
+            self.worker_factory(worker_id, self.config, self.frontier, self.stats)
             for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
@@ -24,3 +34,13 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        shutdown_parse_pool()
+        close_page_caches()
+        self.stats.checkpoint()
+        self.logger.info(
+            f"Crawl statistics saved in {self.stats.stats_dir}, "
+            f"run python -m crawler.report to print the report.")
+
+    def snapshot(self):
+        '''Returns the report information gathered by all workers so far.'''
+        return self.stats.snapshot()
@@ -0,0 +1,172 @@
+import asyncio
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import get_logger
+from utils.async_download import AsyncCacheClient
+from utils.download import decode_response
+from utils.page_cache import get_page_cache, close_page_caches
+from utils.metrics import metrics, start_metrics_server
+from crawler.frontier import Frontier
+from crawler.stats import CrawlStats
+from crawler.worker import in_allowed_domains, same_host
+from crawler.parse_pool import get_parse_pool, shutdown_parse_pool
+import scraper
+
+
+class AsyncCrawler(object):
+    '''Crawler that downloads from one asyncio event loop instead of one thread
+    per worker. Up to ASYNC_CONCURRENCY downloads are in flight at once, the
+    frontier still decides when each host may be fetched again, and decoding
+    and scraping run on THREADCOUNT threads so they do not block the loop.'''
+    def __init__(self, config, restart, frontier_factory=Frontier):
+        self.config = config
+        self.logger = get_logger("CRAWLER")
+        scraper.set_url_filter(config)
+        self.frontier = frontier_factory(config, restart)
+        self.stats = CrawlStats(config, restart)
+        start_metrics_server(config)
+        if hasattr(self.frontier, "scorer"):
+            self.frontier.scorer.traps = self.stats.traps
+        self.executor = None
+        self.frontier_executor = None
+        self.client = None
+
+    def start(self):
+        asyncio.run(self._crawl())
+        self.join()
+
+    def join(self):
+        shutdown_parse_pool()
+        close_page_caches()
+        self.stats.checkpoint()
+        self.logger.info(
+            f"Crawl statistics saved in {self.stats.stats_dir}, "
+            f"run python -m crawler.report to print the report.")
+
+    def snapshot(self):
+        '''Returns the report information gathered so far.'''
+        return self.stats.snapshot()
+
+    async def _crawl(self):
+        self.client = AsyncCacheClient(self.config)
+        self.executor = ThreadPoolExecutor(self.config.threads_count)
+        # The frontier lock can be held while the save file is read or
+        # written, so the loop never takes it itself. Polling gets its own
+        # thread rather than queueing behind the scrapes.
+        self.frontier_executor = ThreadPoolExecutor(1)
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.config.async_concurrency)
+        tasks = set()
+        try:
+            while True:
+                await slots.acquire()
+                url, delay = await loop.run_in_executor(
+                    self.frontier_executor, self.frontier.poll_tbd_url)
+                if url:
+                    task = asyncio.ensure_future(self._process_url(url, slots))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    continue
+                slots.release()
+                if delay is None and not tasks:
+                    self.logger.info("Frontier is empty. Stopping Crawler.")
+                    break
+                # Wait for the next host to become ready, or for a download to
+                # finish and possibly add urls.
+                if tasks:
+                    await asyncio.wait(
+                        set(tasks), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(delay)
+        finally:
+            self.client.close()
+            self.executor.shutdown()
+            self.frontier_executor.shutdown()
+
+    async def _download(self, url):
+        loop = asyncio.get_running_loop()
+        page_cache = get_page_cache(self.config)
+        if page_cache is not None and url in page_cache:
+            metrics.count("page_cache_hits")
+            return await loop.run_in_executor(self.executor, self._decode_cached, page_cache, url)
+        start = time.perf_counter()
+        try:
+            status, body = await self.client.download(url)
+        except Exception as e:
+            metrics.count("download_errors")
+            self.logger.error(f"Spacetime request error {e!r} with url {url}.")
+            return decode_response(url, 600, None)
+        metrics.observe("download", time.perf_counter() - start)
+        resp = await loop.run_in_executor(
+            self.executor, decode_response, url, status, body, self.logger)
+        if page_cache is not None:
+            await loop.run_in_executor(
+                self.executor, page_cache.add_response, url, status, body, resp)
+        self.logger.info(
+            f"Downloaded {url}, status <{resp.status}>, "
+            f"using cache {self.config.cache_server}.")
+        return resp
+
+    def _decode_cached(self, page_cache, url):
+        return decode_response(url, *page_cache.get(url), self.logger)
+
+    async def _process_url(self, tbd_url, slots):
+        '''Same steps as Worker._process_url, awaiting the downloads.'''
+        fetched = True
+        try:
+            fetched = self.stats.traps.should_fetch(tbd_url)
+            if not fetched:
+                metrics.count("trap_skips")
+                self.logger.info(f"Skipped {tbd_url}, its url pattern is out of fetches.")
+                return
+            max_redirects = 6
+            url = tbd_url
+            resp = await self._download(tbd_url)
+            while (301 <= resp.status <= 308):
+                if max_redirects <= 0:
+                    print(f"Error: Max redirects exceeded for URL: {tbd_url}")
+                    return
+                if not in_allowed_domains(resp.url):
+                    return
+                if not same_host(url, resp.url):
+                    if scraper.is_valid(resp.url):
+                        await asyncio.get_running_loop().run_in_executor(
+                            self.executor, self.frontier.add_url, resp.url, tbd_url)
+                    return
+                await asyncio.sleep(self.config.time_delay)
+                url = resp.url
+                resp = await self._download(url)
+                max_redirects -= 1
+            page = None
+            parse_pool = get_parse_pool(self.config)
+            if (parse_pool and resp.status == 200 and resp.raw_response is not None
+                    and scraper.is_html(resp)):
+                start = time.perf_counter()
+                page = await asyncio.wrap_future(parse_pool.submit(
+                    scraper.parse_page_compact, tbd_url, resp.raw_response.content))
+                metrics.observe("parse", time.perf_counter() - start)
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._scrape, tbd_url, resp, page)
+        except Exception as e:
+            self.logger.error(f"Failed to process {tbd_url}: {e!r}")
+        finally:
+            try:
+                # Takes the frontier lock, which the scrape threads hold while
+                # adding urls, so it runs off the event loop.
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.frontier.mark_url_complete, tbd_url, fetched)
+            finally:
+                slots.release()
+
+    def _scrape(self, url, resp, page):
+        '''Runs on an executor thread, which has its own part of the stats.'''
+        scraped_urls = scraper.scraper(
+            url, resp, self.stats.report_info(),
+            self.stats.traps, self.stats.visited_urls_hash, page)
+        new_urls = 0
+        for scraped_url in scraped_urls:
+            if self.frontier.add_url(scraped_url, parent=url):
+                new_urls += 1
+        self.stats.traps.record_page(url, new_urls)
@@ -1,18 +1,49 @@
 import os
-import shelve
+import time
+import heapq
 
-from threading import Thread, RLock
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
+from itertools import count
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
+from utils import get_logger, get_urlhash, get_seen_key, normalize
+from utils.bloom import BloomFilter
+from utils.metrics import metrics
+from crawler.storage import open_store, remove_save_file
+from crawler.scoring import load_scorer
 from scraper import is_valid
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
+
+        '''Per-host scheduler state. Each host with pending URLs has its own
+        heap of (score, order, url, depth) in `host_queues`, so its best
+        scored url is downloaded first. A host with pending URLs has exactly
+        one entry in either `waiting_hosts`, a heap of (next allowed fetch
+        time, host), or `ready_hosts`, a heap of (best score, host) of the
+        hosts that may be fetched now, unless it is in `busy_hosts`: a host
+        has at most one URL being downloaded, and is only scheduled again,
+        time_delay after that download finished, by mark_url_complete.
+        `in_flight_depths` holds the depth of the URLs handed to workers that
+        have not been marked complete yet, and `host_fetched` how many URLs
+        of each host were handed out.'''
+        self.lock = RLock()
+        self.has_work = Condition(self.lock)
+        self.host_queues = dict()
+        self.waiting_hosts = list()
+        self.ready_hosts = list()
+        self.next_fetch_time = dict()
+        self.busy_hosts = set()
+        self.host_fetched = dict()
+        self.order = count()
+        self.in_flight = 0
+        self.in_flight_depths = dict()
+        self.warned_full = False
+        self.scorer = load_scorer(self.config.scorer)(self.config, self)
+
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -22,9 +53,14 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            remove_save_file(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        # Writes are batched by the store instead of syncing every url.
+        self.save = open_store(self.config)
+        '''Every url in the save file is also added to `seen`, so add_url can
+        tell new urls apart without a lookup in the save file.'''
+        self.seen = BloomFilter(
+            self.config.seen_filter_capacity, self.config.seen_filter_error)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
@@ -37,36 +73,148 @@ class Frontier(object):
 
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        total_count = 0
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        # One pass over the save file. The scores are kept in it, so the crawl
+        # resumes in the order it left off.
+        with self.lock:
+            for url, completed, depth, score in self.save.entries():
+                self.seen.add(get_seen_key(url))
+                total_count += 1
+                if not completed and is_valid(url):
+                    self._enqueue(url, depth, score)
+                    tbd_count += 1
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
+    def _enqueue(self, url, depth, score):
+        '''Pushes url on its host's queue, scheduling the host if it was idle.'''
+        host = urlparse(url).netloc
+        with self.lock:
+            queue = self.host_queues.get(host)
+            if queue is None:
+                queue = self.host_queues[host] = list()
+            heapq.heappush(queue, (score, next(self.order), url, depth))
+            if len(queue) == 1 and host not in self.busy_hosts:
+                heapq.heappush(
+                    self.waiting_hosts, (self.next_fetch_time.get(host, 0.0), host))
+                self.has_work.notify()
+
+    def _pop_ready_url(self):
+        '''Returns (url, None) with the best scored url of the hosts that may be
+        fetched now, or (None, delay) with the seconds until the next host may
+        be fetched, or (None, None) if nothing is queued. Call with lock held.
+
+        A host in `ready_hosts` keeps the score its best url had when the host
+        became ready; urls added to it afterwards still leave its queue in
+        order.'''
+        now = time.monotonic()
+        while self.waiting_hosts and self.waiting_hosts[0][0] <= now:
+            _, host = heapq.heappop(self.waiting_hosts)
+            heapq.heappush(self.ready_hosts, (self.host_queues[host][0][0], host))
+        if not self.ready_hosts:
+            if not self.waiting_hosts:
+                return None, None
+            return None, self.waiting_hosts[0][0] - now
+        _, host = heapq.heappop(self.ready_hosts)
+        queue = self.host_queues[host]
+        _, _, url, depth = heapq.heappop(queue)
+        self.host_fetched[host] = self.host_fetched.get(host, 0) + 1
+        if not queue:
+            del self.host_queues[host]
+        # Off both heaps until mark_url_complete, so a host never has two
+        # downloads at once, however long one takes.
+        self.busy_hosts.add(host)
+        self.in_flight += 1
+        self.in_flight_depths[url] = depth
+        return url, None
+
     def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+        '''Blocks until some host is allowed to be fetched again and returns one
+        of its URLs. Returns None once nothing is queued and no URL is being
+        downloaded, since only in-flight URLs can add more work.'''
+        with self.lock:
+            while True:
+                url, delay = self._pop_ready_url()
+                if url:
+                    return url
+                if delay is not None:
+                    self.has_work.wait(delay)
+                elif self._finished():
+                    # Wake up the other workers so they can stop as well.
+                    self.has_work.notify_all()
+                    return None
+                else:
+                    self.has_work.wait(self.idle_timeout)
 
-    def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
-    def mark_url_complete(self, url):
+    # Seconds an idle worker waits before checking _finished again; None
+    # waits until a url is queued or completed.
+    idle_timeout = None
+
+    def _finished(self):
+        '''Returns whether no more urls can come, once nothing is queued.
+        Call with lock held.'''
+        return self.in_flight == 0
+
+    def poll_tbd_url(self):
+        '''Non-blocking get_tbd_url for event loops. Returns (url, None) if a url
+        may be downloaded now, (None, delay) if one may be in delay seconds, and
+        (None, None) if nothing is queued.'''
+        with self.lock:
+            return self._pop_ready_url()
+
+    def add_url(self, url, parent=None):
+        '''Returns True if url is new and was queued. parent is the downloaded
+        url whose page linked to url; seeds have none.'''
+        with metrics.timer("frontier_add"):
+            depth = self.in_flight_depths.get(parent, -1) + 1 if parent else 0
+            return self._add_url(normalize(url), depth)
+
+    def _add_url(self, url, depth):
+        '''Queues the canonical url at depth if it was not seen before.'''
+        with self.lock:
+            '''Urls the filter has probably seen are skipped, so a new url is lost
+            only with probability SEEN_FILTER_ERROR. Past its capacity the
+            filter's error keeps growing, so from then on its answer is checked
+            in the save file and no new url is lost.'''
+            if self.seen.add(get_seen_key(url)):
+                if not self.seen.is_full() or get_urlhash(url) in self.save:
+                    metrics.count("urls_seen")
+                    return False
+                metrics.count("seen_filter_false_positives")
+            if self.seen.is_full() and not self.warned_full:
+                self.warned_full = True
+                self.logger.warning(
+                    f"Seen url filter holds more than {self.seen.capacity} urls, "
+                    f"checking the urls it has seen in the save file from now on; "
+                    f"increase SEEN_FILTER_CAPACITY.")
+            score = self.scorer.score(url, depth)
+            self.save[get_urlhash(url)] = (url, False, depth, score)
+            self._enqueue(url, depth, score)
+            metrics.count("urls_added")
+            return True
+
+    def mark_url_complete(self, url, fetched=True):
+        '''Records url as done and lets its host be fetched again, time_delay
+        seconds from now if url was fetched. A url that was skipped without a
+        request leaves the host's next fetch time as it was.'''
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        host = urlparse(url).netloc
+        with self.lock:
+            if url not in self.in_flight_depths:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but it was not being downloaded.")
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+            self.save[urlhash] = (url, True, self.in_flight_depths.pop(url, 0))
+            self.busy_hosts.discard(host)
+            if fetched:
+                self.next_fetch_time[host] = time.monotonic() + self.config.time_delay
+            if host in self.host_queues:
+                heapq.heappush(
+                    self.waiting_hosts, (self.next_fetch_time.get(host, 0.0), host))
+                self.has_work.notify()
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.has_work.notify_all()
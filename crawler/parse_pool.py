@@ -0,0 +1,45 @@
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import RLock
+
+from utils.metrics import metrics
+import scraper
+
+_pool = None
+_pool_lock = RLock()
+
+
+def get_parse_pool(config):
+    '''Returns the process pool that parses pages when PARSE_PROCESSES > 0,
+    creating it on first use, or None when pages are parsed in the workers.
+    Processes are spawned rather than forked, since the crawler already runs
+    threads when the pool is created.'''
+    global _pool
+    if config.parse_processes <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                config.parse_processes, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def parse_in_pool(pool, url, resp):
+    '''Parses resp in the pool and returns its ParsedPage, or None if there is
+    nothing to parse or resp is not html, in which case the scraper handles resp as usual.'''
+    if resp.status != 200 or resp.raw_response is None or not scraper.is_html(resp):
+        return None
+    try:
+        with metrics.timer("parse"):
+            return pool.submit(scraper.parse_page_compact, url, resp.raw_response.content).result()
+    except Exception:
+        return None
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,50 @@
+'''Runs the pages of the page cache through the scraper again, without the
+cache server, to produce the report after the scraper or its settings
+changed:
+
+    python launch.py --recrawl
+
+The statistics are written to <SAVE>.recrawl.stats, leaving those of the
+crawl alone, and printed with
+
+    python -m crawler.report --stats_dir <SAVE>.recrawl.stats
+'''
+from utils import get_logger
+from utils.download import decode_response
+from utils.page_cache import PageArchive
+from crawler.stats import CrawlStats
+import scraper
+
+
+class Recrawler(object):
+    '''Scrapes every page in PAGE_CACHE, and in the page caches of its shards
+    if the crawl was sharded, once, in the order the pages were
+    downloaded, at the speed the disk and the parser allow. Redirects and the
+    urls the scraper returns are not followed, since every page the crawl
+    reached is in the cache already; urls that were never downloaded are
+    not either.'''
+    def __init__(self, config):
+        self.config = config
+        self.logger = get_logger("RECRAWL")
+        scraper.set_url_filter(config)
+        self.stats = CrawlStats(config, True, f"{config.save_file}.recrawl.stats")
+
+    def start(self):
+        if not self.config.page_cache:
+            self.logger.error("Set PAGE_CACHE in the config to recrawl the cached pages.")
+            return
+        page_cache = PageArchive(self.config.page_cache)
+        report_info = self.stats.report_info()
+        page_count = 0
+        for url, status_code, body in page_cache.pages():
+            resp = decode_response(url, status_code, body, self.logger)
+            try:
+                scraper.scraper(
+                    url, resp, report_info, self.stats.traps, self.stats.visited_urls_hash)
+            except Exception as e:
+                self.logger.error(f"Failed to scrape {url}: {e!r}")
+            page_count += 1
+        page_cache.close()
+        self.stats.checkpoint()
+        self.logger.info(
+            f"Scraped {page_count} cached pages, statistics saved in {self.stats.stats_dir}.")
@@ -0,0 +1,44 @@
+'''Prints the crawl report from the statistics checkpointed next to the save
+file, while the crawler is running or after it stopped:
+
+    python -m crawler.report [--config_file config.ini] [--stats_dir DIR ...]
+'''
+from configparser import ConfigParser
+from argparse import ArgumentParser
+
+from crawler.stats import load_checkpoint, merge_reports
+
+
+def print_report(report, top_count=50):
+    '''Print out the required information for the report.'''
+    #unique pages
+    print("unique page count:", report.get_unique_page_count())
+    #max words and the page with the max words
+    print("page with max words:", report.get_max_words_url())
+    print("page with max words #:", report.get_max_words())
+    #top words without stopwords
+    print(f"top {top_count} words:")
+    for word, count in report.get_top_words(top_count):
+        print("{}, {}".format(word, count))
+    # listing subdomains of ics.uci.edu
+    print("all subdomains of ics.uci.edu:")
+    sub_domains = report.get_sub_domains_page_count()
+    for sub_domain in sorted(sub_domains):
+        print("{}, {}".format(sub_domain, sub_domains[sub_domain]))
+
+
+def main(config_file, stats_dirs, top_count):
+    if not stats_dirs:
+        cparser = ConfigParser()
+        cparser.read(config_file)
+        stats_dirs = [f"{cparser['LOCAL PROPERTIES']['SAVE']}.stats"]
+    print_report(merge_reports([load_checkpoint(stats_dir) for stats_dir in stats_dirs]), top_count)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--stats_dir", type=str, nargs="*", default=None)
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+    main(args.config_file, args.stats_dir, args.top)
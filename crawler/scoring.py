@@ -0,0 +1,44 @@
+import math
+
+from importlib import import_module
+from urllib.parse import urlparse
+
+
+def load_scorer(path):
+    '''Returns the scorer class named by a dotted path, e.g.
+    crawler.scoring.UrlScorer.'''
+    module, _, name = path.rpartition(".")
+    return getattr(import_module(module), name)
+
+
+class UrlScorer(object):
+    '''Orders the frontier: urls with lower scores are downloaded first. A
+    url scores its depth from the seed, plus how many pages its host has
+    already given, plus how much of its pattern's fetch budget is spent and
+    how many pages of its pattern were fetched already. Shallow urls on
+    hosts and patterns that have not been crawled much come first, and the
+    pages of a trap sink behind everything else long before its budget runs
+    out.
+
+    Scores are taken once, when a url is added. Another scorer can be set
+    with SCORER; it is created with the config and the frontier and has to
+    offer score(url, depth) and a traps attribute.'''
+    DEPTH_WEIGHT = 1.0
+    HOST_WEIGHT = 0.5
+    BUDGET_WEIGHT = 4.0
+    NOVELTY_WEIGHT = 0.5
+
+    def __init__(self, config, frontier):
+        self.frontier = frontier
+        # Set by the crawler to its TrapDetector once the stats are loaded.
+        self.traps = None
+
+    def score(self, url, depth):
+        host = urlparse(url).netloc
+        score = self.DEPTH_WEIGHT * depth
+        score += self.HOST_WEIGHT * math.log2(1 + self.frontier.host_fetched.get(host, 0))
+        if self.traps is not None:
+            left, pages = self.traps.state(url)
+            score += self.BUDGET_WEIGHT * (1 - left / max(self.traps.budget, 1))
+            score += self.NOVELTY_WEIGHT * math.log2(1 + pages)
+        return score
@@ -0,0 +1,196 @@
+'''Runs one crawl as several crawler processes, each owning the hosts that a
+consistent hash ring assigns to it:
+
+    python3 launch.py --shards 4
+
+Every shard has its own frontier, save file <SAVE>.shard<i>, statistics and
+politeness state. Since a host belongs to exactly one shard, the politeness
+delay and the trap budgets of its url patterns stay in one process. Links to
+hosts of other shards are handed to their owner through a queue, and the
+reports of all shards are merged once the crawl is over. If a shard fails,
+the others are stopped, since the urls it held would never be crawled; the
+crawl can be resumed once the problem is fixed.
+'''
+import os
+import sys
+import bisect
+import signal
+import multiprocessing
+
+from multiprocessing.connection import wait
+
+from functools import partial, lru_cache
+from hashlib import md5
+from threading import Thread
+from urllib.parse import urlparse
+
+from utils import get_logger, get_seen_key
+from utils.metrics import metrics
+from crawler.frontier import Frontier
+from crawler.stats import load_checkpoint, merge_reports
+
+
+class HashRing(object):
+    '''Consistent hashing of hosts to shards. Each shard has `replicas` points
+    on the ring and a host belongs to the shard of the first point after the
+    hash of the host, so adding a shard only moves about 1/shards of the
+    hosts.'''
+    def __init__(self, shards, replicas=64):
+        self.shards = shards
+        points = sorted(
+            (self._hash(f"{shard}-{replica}"), shard)
+            for shard in range(shards) for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.owners = [shard for _, shard in points]
+        self.shard_of_host = lru_cache(maxsize=1 << 16)(self._shard_of_host)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def _shard_of_host(self, host):
+        index = bisect.bisect(self.hashes, self._hash(host)) % len(self.hashes)
+        return self.owners[index]
+
+    def shard_of(self, url):
+        return self.shard_of_host(urlparse(url).netloc)
+
+
+class ShardedFrontier(Frontier):
+    '''Frontier of the hosts that ring assigns to shard. Urls of other hosts
+    are sent to the inbox of their shard instead of being queued, and a
+    thread queues the urls arriving in this shard's inbox.
+
+    `pending`, shared by all shards, counts the urls queued or in flight in
+    any shard plus the urls on their way to another shard. The crawl is only
+    over when it drops to 0; until then idle workers keep checking it. It
+    starts at the number of shards, and each shard takes one off once its
+    frontier is loaded, so no shard stops before the others had a chance to
+    queue their seeds.'''
+    idle_timeout = 0.1
+
+    def __init__(self, config, restart, shard, ring, inboxes, pending):
+        self.shard = shard
+        self.ring = ring
+        self.inboxes = inboxes
+        self.pending = pending
+        super().__init__(config, restart)
+        Thread(target=self._receive, daemon=True).start()
+        self._add_pending(-1)
+
+    def _add_pending(self, amount):
+        with self.pending.get_lock():
+            self.pending.value += amount
+
+    def _finished(self):
+        return self.in_flight == 0 and self.pending.value == 0
+
+    def _enqueue(self, url, depth, score):
+        self._add_pending(1)
+        super()._enqueue(url, depth, score)
+
+    def _add_url(self, url, depth):
+        shard = self.ring.shard_of(url)
+        if shard == self.shard:
+            return super()._add_url(url, depth)
+        with self.lock:
+            # Urls sent before are not sent again; their owner would skip them.
+            # Once the filter is past its capacity they are all sent, and the
+            # owner, which checks its save file, drops the ones it has.
+            if self.seen.add(get_seen_key(url)) and not self.seen.is_full():
+                metrics.count("urls_seen")
+                return False
+        self._add_pending(1)
+        self.inboxes[shard].put((url, depth))
+        metrics.count("urls_handed_off")
+        return True
+
+    def _receive(self):
+        inbox = self.inboxes[self.shard]
+        while True:
+            url, depth = inbox.get()
+            try:
+                super()._add_url(url, depth)
+            finally:
+                self._add_pending(-1)
+                with self.lock:
+                    self.has_work.notify_all()
+
+    def poll_tbd_url(self):
+        url, delay = super().poll_tbd_url()
+        if url is None and delay is None and self.pending.value > 0:
+            # Other shards are still crawling and may send urls.
+            delay = self.idle_timeout
+        return url, delay
+
+    def mark_url_complete(self, url, fetched=True):
+        super().mark_url_complete(url, fetched)
+        self._add_pending(-1)
+
+
+def shard_save_file(save_file, shard):
+    return f"{save_file}.shard{shard}"
+
+
+def shard_config(config, shard):
+    '''Returns the config of shard: its own save file, next to which its
+    statistics are kept, and its own page cache and metrics port.'''
+    config.save_file = shard_save_file(config.save_file, shard)
+    if config.page_cache:
+        config.page_cache = os.path.join(config.page_cache, f"shard{shard}")
+    if config.metrics_port > 0:
+        config.metrics_port += shard
+    return config
+
+
+def run_shard(engine_class, config, restart, shard, shards, inboxes, pending):
+    # Exit normally when stopped, so the frontier flushes its pending writes.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    for inbox in inboxes:
+        # A stopped shard does not wait for urls it sent to be read; once the
+        # crawl is over they all have been.
+        inbox.cancel_join_thread()
+    ring = HashRing(shards)
+    frontier_factory = partial(
+        ShardedFrontier, shard=shard, ring=ring, inboxes=inboxes, pending=pending)
+    engine_class(shard_config(config, shard), restart, frontier_factory=frontier_factory).start()
+
+
+def run_sharded(engine_class, config, restart, shards):
+    '''Crawls with `shards` processes, each running engine_class, and returns
+    the merged report information of all of them.'''
+    logger = get_logger("CRAWLER")
+    # Spawned rather than forked, like the parse processes.
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(shards)]
+    pending = context.Value("q", shards)
+    processes = [
+        context.Process(
+            target=run_shard, name=f"Shard-{shard}",
+            args=(engine_class, config, restart, shard, shards, inboxes, pending))
+        for shard in range(shards)]
+    for process in processes:
+        process.start()
+    running = {process.sentinel: shard for shard, process in enumerate(processes)}
+    failed = None
+    while running:
+        for sentinel in wait(list(running)):
+            shard = running.pop(sentinel)
+            processes[shard].join()
+            if processes[shard].exitcode != 0 and failed is None:
+                failed = shard
+                logger.error(
+                    f"Shard {shard} exited with code {processes[shard].exitcode}, "
+                    f"stopping the other shards.")
+                for other in running.values():
+                    processes[other].terminate()
+    if failed is not None:
+        raise RuntimeError(f"Shard {failed} failed, the crawl was stopped.")
+    stats_dirs = [
+        f"{shard_save_file(config.save_file, shard)}.stats" for shard in range(shards)]
+    logger.info(
+        f"Crawl statistics saved in {', '.join(stats_dirs)}, run python -m "
+        f"crawler.report --stats_dir {' '.join(stats_dirs)} to print the report.")
+    return merge_reports([
+        load_checkpoint(stats_dir, config.word_count_mode, config.word_memory_limit)
+        for stats_dir in stats_dirs if os.path.exists(stats_dir)])
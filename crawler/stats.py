@@ -0,0 +1,255 @@
+import os
+import json
+import atexit
+import shutil
+
+from glob import glob
+from threading import Thread, RLock, Event, local
+from collections import defaultdict
+from itertools import chain
+from uuid import uuid4
+
+from utils.simhash import SimHashIndex
+from utils.metrics import metrics
+from crawler.traps import TrapDetector
+from crawler.wordcount import (
+    WordCounter, ApproximateWordCounter, STOPWORDS, top_words, merge_approximate)
+
+# Files of a checkpoint in the stats directory.
+SUMMARY = "report.json"
+FINGERPRINTS = "fingerprints.bin"
+SKETCH = "words.cms"
+TRAPS = "traps.json"
+METRICS = "metrics.json"
+
+
+class ReportInformation(object):
+    '''Stores all the information we need for our report.
+    CrawlStats keeps one per worker thread and merges them on read.
+    Word counts and unique pages are kept by word_counters and page_logs, which
+    bound their memory; a thread has one of each, a merged snapshot has those
+    of every thread.'''
+    def __init__(self, word_counters, page_logs):
+        self.word_counters = word_counters
+        self.page_logs = page_logs
+        self.unique_page_count = 0
+        self.max_words = 0
+        self.max_words_url = ""
+        self.sub_domains_page_count = defaultdict(int) # dict holds (url, int)
+        self.urls_failed_count = 0
+        self.redirected_urls = {} # dict holds (from_url, to_url)
+
+    '''Methods to store/retrieve above information'''
+    def get_max_words(self):
+        return self.max_words
+
+    def get_max_words_url(self):
+        return self.max_words_url
+
+    def get_top_words(self, n, stopwords=STOPWORDS):
+        return top_words(self.word_counters, n, stopwords)
+
+    def increment_word_frequency(self, word):
+        self.word_counters[0].update((word,))
+
+    def add_words(self, words):
+        self.word_counters[0].update(words)
+
+    def get_unique_page_count(self):
+        return self.unique_page_count
+
+    def increment_unique_page_count(self):
+        self.unique_page_count += 1
+
+    def add_unique_page(self, url):
+        self.page_logs[0].append(url)
+
+    def get_unique_pages(self):
+        return chain.from_iterable(self.page_logs)
+
+    def set_max_words_url(self, url, word_count):
+        self.max_words_url = url
+        self.max_words = word_count
+
+    def increment_sub_domains_page_count(self, url):
+        self.sub_domains_page_count[url] += 1    
+
+    def get_sub_domains_page_count(self):
+        return self.sub_domains_page_count
+
+
+class PageLog(object):
+    '''Append-only list of urls stored in a file, with only the last
+    `buffer_size` urls kept in memory.'''
+    def __init__(self, path, buffer_size=1000):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = list()
+        self.lock = RLock()
+
+    def append(self, url):
+        with self.lock:
+            self.buffer.append(url)
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            buffer, self.buffer = self.buffer, list()
+            with open(self.path, "a", encoding="utf-8") as log:
+                log.writelines(f"{url}\n" for url in buffer)
+
+    def __iter__(self):
+        self.flush()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as log:
+            for line in log:
+                yield line.rstrip("\n")
+
+
+class CrawlStats(object):
+    '''Crawl-wide statistics shared by all workers. Every thread writes to its
+    own ReportInformation, so the per-word updates never wait on a lock, and
+    snapshot() merges them while the crawl is running. Word count runs, page
+    logs and checkpoints are written to `stats_dir`, next to the save file,
+    and loaded again when the crawl resumes.'''
+    def __init__(self, config, restart=False, stats_dir=None):
+        self.config = config
+        self.stats_dir = stats_dir or f"{config.save_file}.stats"
+        if restart and os.path.exists(self.stats_dir):
+            shutil.rmtree(self.stats_dir)
+        self.shards = list()
+        self.local = local()
+        self.lock = RLock()
+        self.checkpoint_lock = RLock()
+        '''traps holds the fetch budgets of url patterns, visited_urls_hash the
+        fingerprints used to check for duplicate pages'''
+        self.traps = TrapDetector(config.trap_budget, config.trap_shrink)
+        self.visited_urls_hash = SimHashIndex(config.simhash_threshold)
+        if os.path.exists(self.stats_dir):
+            # Information from before the restart is kept as one more shard.
+            resumed = load_checkpoint(
+                self.stats_dir, config.word_count_mode, config.word_memory_limit)
+            for counter in resumed.word_counters:
+                if isinstance(counter, WordCounter):
+                    # The runs now belong to this crawl, which may merge them.
+                    counter.spill()
+            self.shards.append(resumed)
+            fingerprints = os.path.join(self.stats_dir, FINGERPRINTS)
+            if os.path.exists(fingerprints):
+                self.visited_urls_hash.load(fingerprints)
+            traps = os.path.join(self.stats_dir, TRAPS)
+            if os.path.exists(traps):
+                self.traps.load(traps)
+        self.closed = Event()
+        if config.stats_interval > 0:
+            Thread(target=self._checkpoint_periodically, daemon=True).start()
+        atexit.register(self.checkpoint)
+
+    def report_info(self):
+        '''Returns the ReportInformation the current thread writes to.'''
+        report_info = getattr(self.local, "report_info", None)
+        if report_info is None:
+            report_info = self.local.report_info = ReportInformation(
+                [self._word_counter()],
+                [PageLog(os.path.join(self.stats_dir, f"pages-{uuid4().hex}.log"))])
+            with self.lock:
+                self.shards.append(report_info)
+        return report_info
+
+    def _word_counter(self):
+        if self.config.word_count_mode == "approximate":
+            return ApproximateWordCounter(self.config.word_memory_limit)
+        return WordCounter(self.stats_dir, self.config.word_memory_limit)
+
+    def snapshot(self):
+        '''Returns a ReportInformation with the totals of all threads so far.'''
+        with self.lock:
+            shards = list(self.shards)
+        return merge_reports(shards)
+
+    def _checkpoint_periodically(self):
+        while not self.closed.wait(self.config.stats_interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        '''Writes everything needed to resume the statistics, or to produce
+        the report offline, to stats_dir.'''
+        with self.checkpoint_lock:
+            os.makedirs(self.stats_dir, exist_ok=True)
+            report = self.snapshot()
+            for log in report.page_logs:
+                log.flush()
+            if self.config.word_count_mode == "approximate":
+                if report.word_counters:
+                    merge_approximate(report.word_counters).dump(
+                        os.path.join(self.stats_dir, SKETCH))
+            else:
+                for counter in report.word_counters:
+                    counter.spill()
+            self.visited_urls_hash.dump(os.path.join(self.stats_dir, FINGERPRINTS))
+            self.traps.dump(os.path.join(self.stats_dir, TRAPS))
+            metrics.dump(os.path.join(self.stats_dir, METRICS))
+            summary = {
+                "word_count_mode": self.config.word_count_mode,
+                "unique_page_count": report.unique_page_count,
+                "max_words": report.max_words,
+                "max_words_url": report.max_words_url,
+                "sub_domains_page_count": report.sub_domains_page_count,
+                "urls_failed_count": report.urls_failed_count,
+                "redirected_urls": report.redirected_urls,
+            }
+            path = os.path.join(self.stats_dir, SUMMARY)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as summary_file:
+                json.dump(summary, summary_file)
+            os.replace(f"{path}.tmp", path)
+
+
+def merge_reports(reports):
+    '''Returns one ReportInformation with the totals of all reports.'''
+    merged = ReportInformation(
+        [counter for report in reports for counter in report.word_counters],
+        [log for report in reports for log in report.page_logs])
+    for report in reports:
+        # dict() copies in one step, so workers can keep writing.
+        merged.unique_page_count += report.unique_page_count
+        if report.max_words > merged.max_words:
+            merged.set_max_words_url(report.max_words_url, report.max_words)
+        for sub_domain, count in dict(report.sub_domains_page_count).items():
+            merged.sub_domains_page_count[sub_domain] += count
+        merged.urls_failed_count += report.urls_failed_count
+        merged.redirected_urls.update(dict(report.redirected_urls))
+    return merged
+
+
+def load_checkpoint(stats_dir, word_count_mode="exact", word_memory_limit=100000):
+    '''Loads the ReportInformation checkpointed in stats_dir. Word count runs
+    and page logs written after the last checkpoint are included as well.
+    Nothing in stats_dir is changed, so it can be loaded while the crawl that
+    writes it is running.'''
+    summary = dict()
+    path = os.path.join(stats_dir, SUMMARY)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as summary_file:
+            summary = json.load(summary_file)
+    word_count_mode = summary.get("word_count_mode", word_count_mode)
+    if word_count_mode == "approximate":
+        counter = ApproximateWordCounter(word_memory_limit)
+        if os.path.exists(os.path.join(stats_dir, SKETCH)):
+            counter.load(os.path.join(stats_dir, SKETCH))
+    else:
+        counter = WordCounter(
+            stats_dir, word_memory_limit,
+            sorted(glob(os.path.join(stats_dir, "words-*.run"))))
+    report = ReportInformation(
+        [counter], [PageLog(path) for path in sorted(glob(os.path.join(stats_dir, "pages-*.log")))])
+    report.unique_page_count = summary.get("unique_page_count", 0)
+    report.set_max_words_url(summary.get("max_words_url", ""), summary.get("max_words", 0))
+    report.sub_domains_page_count.update(summary.get("sub_domains_page_count", {}))
+    report.urls_failed_count = summary.get("urls_failed_count", 0)
+    report.redirected_urls.update(summary.get("redirected_urls", {}))
+    return report
@@ -0,0 +1,293 @@
+import os
+import atexit
+import shelve
+import sqlite3
+
+from contextlib import nullcontext
+from threading import Thread, RLock, Condition, Event, local
+
+from utils.metrics import metrics
+
+
+def unpack(value):
+    '''Returns (url, completed, depth, score) of a stored value. Save files
+    written before urls had a depth and score hold (url, completed).'''
+    url, completed, depth, score = (tuple(value) + (0, 0.0))[:4]
+    return url, completed, depth, score
+
+
+class WriteBehindStore(object):
+    '''Dict-like save file that buffers writes in memory and flushes them in
+    batches, either once `batch_size` writes are pending or every
+    `flush_interval` seconds, and on close. Batches are written by a
+    background thread, so a write only waits for the disk when the next
+    batch is full before the previous one was written. A crash loses at most
+    the batch being written and the next one. Subclasses implement the _db_* methods for the actual
+    storage; those are always called with `db_lock` held, which subclasses
+    whose storage is safe to share between threads can relax.'''
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Writes that have not been handed to the storage yet.
+        self.pending = dict()
+        # The batch currently being written, still visible to readers.
+        self.flushing = dict()
+        self.lock = RLock()
+        # Notified when the flusher takes the pending writes.
+        self.batch_taken = Condition(self.lock)
+        self.flush_lock = RLock()
+        if not hasattr(self, "db_lock"):
+            self.db_lock = RLock()
+        self.closed = Event()
+        # Set by the write that fills a batch, to wake the flusher.
+        self.batch_full = Event()
+        self.flusher = Thread(target=self._flush_in_background, daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def _flush_in_background(self):
+        timeout = self.flush_interval if self.flush_interval > 0 else None
+        while not self.closed.is_set():
+            self.batch_full.wait(timeout)
+            self.batch_full.clear()
+            self.flush()
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            while len(self.pending) >= self.batch_size and not self.closed.is_set():
+                self.batch_taken.wait()
+            self.pending[key] = value
+            if len(self.pending) >= self.batch_size:
+                self.batch_full.set()
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key]
+            if key in self.flushing:
+                return self.flushing[key]
+        with self.db_lock:
+            return self._db_get(key)
+
+    def __contains__(self, key):
+        with self.lock:
+            if key in self.pending or key in self.flushing:
+                return True
+        with self.db_lock:
+            return self._db_contains(key)
+
+    def __len__(self):
+        self.flush()
+        with self.db_lock:
+            return self._db_len()
+
+    def values(self):
+        self.flush()
+        with self.db_lock:
+            return self._db_values()
+
+    def entries(self):
+        '''Yields (url, completed, depth, score) of every url in the store, in
+        one pass over the storage.'''
+        for value in self.values():
+            yield unpack(value)
+
+    def flush(self):
+        '''Writes all pending values to the storage in one batch.'''
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                self.flushing, self.pending = self.pending, dict()
+                self.batch_taken.notify_all()
+            with self.db_lock, metrics.timer("save_flush"):
+                self._db_write(self.flushing)
+            metrics.count("save_writes", len(self.flushing))
+            with self.lock:
+                self.flushing = dict()
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.batch_full.set()
+        with self.lock:
+            self.batch_taken.notify_all()
+        self.flusher.join()
+        self.flush()
+        with self.db_lock:
+            self._db_close()
+
+    def _db_get(self, key):
+        raise NotImplementedError
+
+    def _db_contains(self, key):
+        raise NotImplementedError
+
+    def _db_len(self):
+        raise NotImplementedError
+
+    def _db_values(self):
+        raise NotImplementedError
+
+    def _db_write(self, items):
+        raise NotImplementedError
+
+    def _db_close(self):
+        raise NotImplementedError
+
+
+class ShelveStore(WriteBehindStore):
+    '''Write-behind store on top of a shelve file, synced once per batch.'''
+    def __init__(self, save_file, batch_size, flush_interval):
+        self.shelf = shelve.open(save_file)
+        super().__init__(batch_size, flush_interval)
+
+    def _db_get(self, key):
+        return self.shelf[key]
+
+    def _db_contains(self, key):
+        return key in self.shelf
+
+    def _db_len(self):
+        return len(self.shelf)
+
+    def _db_values(self):
+        return list(self.shelf.values())
+
+    def _db_write(self, items):
+        for key, value in items.items():
+            self.shelf[key] = value
+        self.shelf.sync()
+
+    def _db_close(self):
+        self.shelf.close()
+
+
+class SQLiteStore(WriteBehindStore):
+    '''Write-behind store on top of a SQLite database in WAL mode. Every
+    thread reads through its own connection, and a resume reads the urls a
+    page at a time.'''
+    PAGE_SIZE = 10000
+
+    def __init__(self, save_file, batch_size, flush_interval):
+        self.save_file = save_file
+        self.local = local()
+        self.connections = list()
+        self.connections_lock = RLock()
+        # SQLite does its own locking between connections.
+        self.db_lock = nullcontext()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "urlhash TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                "completed INTEGER NOT NULL, "
+                "depth INTEGER NOT NULL DEFAULT 0, score REAL NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(urls)")}
+            # Save files from before urls had a depth and score.
+            for column, definition in (("depth", "INTEGER"), ("score", "REAL")):
+                if column not in columns:
+                    connection.execute(
+                        f"ALTER TABLE urls ADD COLUMN {column} {definition} NOT NULL DEFAULT 0")
+            # A resume reads every url, so the index that once let it read only
+            # the pending ones just slows down writes, and the host column it
+            # indexed is not needed either.
+            connection.execute("DROP INDEX IF EXISTS urls_completed_host")
+            self.insert = (
+                "INSERT INTO urls (urlhash, url, completed, depth, score) "
+                "VALUES (?, ?, ?, ?, ?) ")
+            if "host" in columns:
+                try:
+                    connection.execute("ALTER TABLE urls DROP COLUMN host")
+                except sqlite3.OperationalError:
+                    # SQLite before 3.35 cannot drop a column; its rows get an
+                    # empty host.
+                    self.insert = (
+                        "INSERT INTO urls (urlhash, url, completed, depth, score, host) "
+                        "VALUES (?, ?, ?, ?, ?, '') ")
+        super().__init__(batch_size, flush_interval)
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.save_file, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            with self.connections_lock:
+                self.connections.append(connection)
+        return connection
+
+    def entries(self):
+        self.flush()
+        connection = self._connection()
+        last_rowid = 0
+        while True:
+            rows = connection.execute(
+                "SELECT rowid, url, completed, depth, score FROM urls "
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, self.PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            for _, url, completed, depth, score in rows:
+                yield url, bool(completed), depth, score
+            last_rowid = rows[-1][0]
+
+    def _db_get(self, key):
+        row = self._connection().execute(
+            "SELECT url, completed, depth, score FROM urls WHERE urlhash = ?",
+            (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0], bool(row[1]), row[2], row[3]
+
+    def _db_contains(self, key):
+        return self._connection().execute(
+            "SELECT 1 FROM urls WHERE urlhash = ?", (key,)).fetchone() is not None
+
+    def _db_len(self):
+        return self._connection().execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def _db_values(self):
+        return [
+            (url, bool(completed), depth, score) for url, completed, depth, score in
+            self._connection().execute("SELECT url, completed, depth, score FROM urls")]
+
+    def _db_write(self, items):
+        rows = list()
+        for key, value in items.items():
+            url, completed, depth, score = unpack(value)
+            rows.append((key, url, int(completed), depth, score))
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                self.insert +
+                "ON CONFLICT (urlhash) DO UPDATE SET completed = excluded.completed",
+                rows)
+
+    def _db_close(self):
+        with self.connections_lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = list()
+
+
+STORES = {
+    "shelve": ShelveStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def open_store(config):
+    '''Opens the save file with the store selected by STORE in config.ini.'''
+    return STORES[config.store](
+        config.save_file, config.save_batch, config.save_interval)
+
+
+def remove_save_file(save_file):
+    '''Deletes the save file along with any journal files next to it.'''
+    for path in (save_file, f"{save_file}-wal", f"{save_file}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
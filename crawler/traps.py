@@ -0,0 +1,98 @@
+import re
+import json
+import os
+
+from threading import RLock
+
+DIGITS = re.compile(r"\d+")
+# Hashes, uuids and session tokens.
+ID_SEGMENT = re.compile(r"[0-9a-fA-F-]{16,}|[A-Za-z0-9_-]{32,}")
+
+
+def url_pattern(url):
+    '''Returns the pattern of the canonical url: its host, its path with every
+    number replaced by 0 and ids by {id}, and the names of its query
+    parameters. Calendar days, wiki revisions and archive pages of one site
+    share a pattern, e.g. wiki.ics.uci.edu/doku.php?do&id&rev.'''
+    address, _, query = url.partition("?")
+    host, _, path = address.partition("://")[2].partition("/")
+    if path:
+        path = "/".join(
+            "{id}" if ID_SEGMENT.fullmatch(segment) else DIGITS.sub("0", segment)
+            for segment in path.split("/"))
+    pattern = f"{host}/{path}"
+    if query:
+        keys = dict.fromkeys(param.partition("=")[0] for param in query.split("&"))
+        pattern += "?" + "&".join(sorted(keys))
+    return pattern
+
+
+class TrapDetector(object):
+    '''Fetch budgets per url pattern, replacing a fixed number of visits per
+    path. Every pattern starts with `budget` fetches. Each fetch spends one;
+    a page that adds new urls to the frontier refunds it and earns one more,
+    up to `budget`, while a near-duplicate page or one without new urls
+    shrinks what is left by `shrink`. Patterns whose pages stop bringing
+    anything new, like calendars, wiki revisions and paginated archives,
+    run out of budget; urls of such a pattern are neither added to the
+    frontier nor downloaded.'''
+    def __init__(self, budget=50, shrink=0.9):
+        self.budget = budget
+        self.shrink = shrink
+        # pattern -> [fetches left, pages fetched]
+        self.patterns = dict()
+        self.lock = RLock()
+
+    def _state(self, pattern):
+        state = self.patterns.get(pattern)
+        if state is None:
+            state = self.patterns[pattern] = [float(self.budget), 0]
+        return state
+
+    def allows(self, url):
+        '''Returns whether the pattern of url has fetches left.'''
+        state = self.patterns.get(url_pattern(url))
+        return state is None or state[0] >= 1
+
+    def state(self, url):
+        '''Returns (fetches left, pages fetched) of the pattern of url.'''
+        state = self.patterns.get(url_pattern(url))
+        if state is None:
+            return float(self.budget), 0
+        return state[0], state[1]
+
+    def should_fetch(self, url):
+        '''Spends one fetch of the pattern of url and returns True, or returns
+        False if the pattern has no fetches left.'''
+        pattern = url_pattern(url)
+        with self.lock:
+            state = self._state(pattern)
+            if state[0] < 1:
+                return False
+            state[0] -= 1
+            state[1] += 1
+            return True
+
+    def record_page(self, url, new_urls):
+        '''Adjusts the budget of the pattern of url after its page added
+        new_urls urls to the frontier. A near-duplicate page adds none.'''
+        pattern = url_pattern(url)
+        with self.lock:
+            state = self._state(pattern)
+            if new_urls:
+                state[0] = min(float(self.budget), state[0] + 2)
+            else:
+                state[0] *= self.shrink
+
+    def dump(self, path):
+        with self.lock:
+            patterns = {pattern: list(state) for pattern, state in self.patterns.items()}
+        with open(f"{path}.tmp", "w", encoding="utf-8") as traps_file:
+            json.dump(patterns, traps_file)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path):
+        with open(path, encoding="utf-8") as traps_file:
+            patterns = json.load(traps_file)
+        with self.lock:
+            self.patterns.update(patterns)
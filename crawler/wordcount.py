@@ -0,0 +1,188 @@
+import os
+import json
+import heapq
+import zlib
+
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from threading import RLock
+from uuid import uuid4
+
+# Runs per WordCounter before they are merged into one.
+MAX_RUNS = 16
+
+STOPWORDS = frozenset("www div http https a about above after again against all am an and any are aren t as at be because been before being below between both but by can't cannot could couldn did didn do does doesn doing don down during each few for from further had hadn has hasn have haven having he he d ll s her here hers herself him himself his how i m ve if in into is isn it its itself let me more most mustn my myself no nor not of off on once only or other ought our ours ourselves out over own same shan she should shouldn so some such than that the their theirs them themselves then there these they this those through to too under until up very was wasn we were weren what when where which while who whom why with won would wouldn you your yours yourself yourselves".split(" "))
+
+
+class WordCounter(object):
+    '''Exact word counts with bounded memory. Counts are kept in a Counter
+    until it holds `memory_limit` distinct words, then written to spill_dir
+    as a run sorted by word and cleared. Reading merges the runs and the
+    in-memory counts with a k-way merge, without loading the runs. Once
+    MAX_RUNS runs exist the next spill merges them into one. A counter given
+    existing runs only reads them until it spills, so the report can load
+    the runs of a crawl that is still running.'''
+    def __init__(self, spill_dir, memory_limit, runs=()):
+        self.spill_dir = spill_dir
+        self.memory_limit = memory_limit
+        self.name = uuid4().hex
+        self.counts = Counter()
+        self.runs = list(runs)
+        self.run_number = 0
+        # Only contended while another thread spills the counts for a checkpoint.
+        self.lock = RLock()
+
+    def update(self, words):
+        '''Adds one to the count of each word in words.'''
+        with self.lock:
+            self.counts.update(words)
+            if len(self.counts) >= self.memory_limit:
+                self.spill()
+
+    def spill(self):
+        '''Writes the in-memory counts to a new sorted run, merging the runs
+        into one if there are MAX_RUNS of them.'''
+        with self.lock:
+            if not self.counts and len(self.runs) < MAX_RUNS:
+                return
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"words-{self.name}-{self.run_number}.run")
+            self.run_number += 1
+            if len(self.runs) + 1 < MAX_RUNS:
+                write_run(path, sorted(self.counts.items()))
+                self.runs.append(path)
+            else:
+                write_run(path, merge_counts(self.sorted_sources()))
+                for run in self.runs:
+                    os.remove(run)
+                self.runs = [path]
+            self.counts = Counter()
+
+    def sorted_sources(self):
+        '''Returns the runs and a sorted copy of the in-memory counts, each an
+        iterable of (word, count) sorted by word.'''
+        with self.lock:
+            # dict() copies in one step, so the owning thread can keep counting.
+            return [read_run(path) for path in self.runs] + [sorted(dict(self.counts).items())]
+
+
+class CountMinSketch(object):
+    '''Approximate counts in a fixed depth x width table. Estimates never
+    undercount, and overcount by a small fraction of the total.'''
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.table = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _columns(self, word):
+        data = word.encode("utf-8")
+        return [zlib.crc32(data, seed) % self.width for seed in range(1, self.depth + 1)]
+
+    def add(self, word, count=1):
+        for row, column in zip(self.table, self._columns(word)):
+            row[column] += count
+
+    def estimate(self, word):
+        return min(row[column] for row, column in zip(self.table, self._columns(word)))
+
+    def merge(self, other):
+        for row, other_row in zip(self.table, other.table):
+            for column, count in enumerate(other_row):
+                if count:
+                    row[column] += count
+
+
+class ApproximateWordCounter(object):
+    '''Word counts in constant memory: a Count-Min Sketch for the counts, and
+    the `candidates` words with the highest estimates for the top-N. Stopwords
+    are dropped when counted so they do not take candidate slots.'''
+    def __init__(self, candidates, width=1 << 18, depth=4):
+        self.candidate_limit = candidates
+        self.sketch = CountMinSketch(width, depth)
+        self.candidates = dict()
+        self.lock = RLock()
+
+    def update(self, words):
+        with self.lock:
+            for word, count in Counter(words).items():
+                if word in STOPWORDS:
+                    continue
+                self.sketch.add(word, count)
+                self.candidates[word] = self.sketch.estimate(word)
+            if len(self.candidates) > 2 * self.candidate_limit:
+                self.candidates = dict(heapq.nlargest(
+                    self.candidate_limit, self.candidates.items(), key=itemgetter(1)))
+
+    def __getitem__(self, word):
+        return self.sketch.estimate(word)
+
+    def dump(self, path):
+        '''Writes the sketch to path and the candidates to path.json.'''
+        with self.lock:
+            with open(path, "wb") as sketch:
+                for row in self.sketch.table:
+                    row.tofile(sketch)
+            with open(f"{path}.json", "w", encoding="utf-8") as candidates:
+                json.dump(self.candidates, candidates)
+
+    def load(self, path):
+        table = list()
+        with open(path, "rb") as sketch:
+            for _ in range(self.sketch.depth):
+                row = array("I")
+                row.fromfile(sketch, self.sketch.width)
+                table.append(row)
+        self.sketch.table = table
+        with open(f"{path}.json", encoding="utf-8") as candidates:
+            self.candidates = json.load(candidates)
+
+
+def write_run(path, items):
+    with open(path, "w", encoding="utf-8") as run:
+        for word, count in items:
+            run.write(f"{word}\t{count}\n")
+
+
+def read_run(path):
+    with open(path, encoding="utf-8") as run:
+        for line in run:
+            word, count = line.rstrip("\n").split("\t")
+            yield word, int(count)
+
+
+def merge_counts(sources):
+    '''Merges iterables of (word, count) sorted by word into one sorted
+    iterable with the total count of each word.'''
+    for word, group in groupby(heapq.merge(*sources, key=itemgetter(0)), key=itemgetter(0)):
+        yield word, sum(count for _, count in group)
+
+
+def merge_approximate(counters):
+    '''Returns an ApproximateWordCounter with the sum of the sketches of
+    counters, and their candidates re-estimated on the merged sketch.'''
+    merged = ApproximateWordCounter(
+        counters[0].candidate_limit, counters[0].sketch.width, counters[0].sketch.depth)
+    candidates = set()
+    for counter in counters:
+        with counter.lock:
+            merged.sketch.merge(counter.sketch)
+            candidates.update(counter.candidates)
+    merged.candidates = {word: merged.sketch.estimate(word) for word in candidates}
+    return merged
+
+
+def top_words(counters, n, stopwords=STOPWORDS):
+    '''Returns the n most frequent words over all counters that are not
+    stopwords, as (word, count) sorted by count and then word. Counters are
+    either all WordCounter or all ApproximateWordCounter.'''
+    if counters and isinstance(counters[0], ApproximateWordCounter):
+        merged = merge_approximate(counters)
+        words = ((word, count) for word, count in merged.candidates.items() if word not in stopwords)
+    else:
+        words = (
+            (word, count) for word, count in
+            merge_counts(source for counter in counters for source in counter.sorted_sources())
+            if word not in stopwords)
+    return heapq.nsmallest(n, words, key=lambda item: (-item[1], item[0]))
@@ -1,23 +1,74 @@
-from configparser import ConfigParser
-from argparse import ArgumentParser
-
-from utils.server_registration import get_cache_server
-from utils.config import Config
-from crawler import Crawler
-
-
-def main(config_file, restart):
-    cparser = ConfigParser()
-    cparser.read(config_file)
-    config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
-    crawler.start()
-
-
-if __name__ == "__main__":
-    parser = ArgumentParser()
-    parser.add_argument("--restart", action="store_true", default=False)
-    parser.add_argument("--config_file", type=str, default="config.ini")
-    args = parser.parse_args()
-    main(args.config_file, args.restart)
+import os
+import sys
+import signal
+from configparser import ConfigParser
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.server_registration import get_cache_server
+from utils.config import Config
+from crawler import Crawler
+from crawler.async_crawler import AsyncCrawler
+
+ENGINES = {"thread": Crawler, "async": AsyncCrawler}
+
+
+def main(
+        config_file, restart, engine="thread", recrawl=False, record=None,
+        cache_server=None, shards=1):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    if record:
+        config.page_cache = record
+    if recrawl:
+        # Only reads the page cache, so there is no cache server to register with.
+        from crawler.recrawl import Recrawler
+        Recrawler(config).start()
+        return
+    if shards > 1:
+        from crawler.sharding import run_sharded, shard_save_file
+        from crawler.report import print_report
+        # The shards only write <SAVE>.shard<i>, never SAVE itself.
+        fresh = restart or not any(
+            os.path.exists(shard_save_file(config.save_file, shard))
+            for shard in range(shards))
+        config.cache_server = cache_server_address(config, fresh, cache_server)
+        print_report(run_sharded(ENGINES[engine], config, restart, shards))
+        return
+    # Whether the crawl starts fresh is decided before the frontier creates
+    # its save file.
+    fresh = restart or not os.path.exists(config.save_file)
+    with ThreadPoolExecutor(1) as executor:
+        # The frontier is loaded while registering with the cache server, so a
+        # crawl with a large save file does not wait for both one after the
+        # other. Downloads only start once both are done.
+        loading = executor.submit(ENGINES[engine], config, restart)
+        config.cache_server = cache_server_address(config, fresh, cache_server)
+        crawler = loading.result()
+    crawler.start()
+
+
+def cache_server_address(config, fresh, cache_server=None):
+    if cache_server:
+        # A stand-in such as utils.replay_server, which needs no registration.
+        host, _, port = cache_server.rpartition(":")
+        return host, int(port)
+    return get_cache_server(config, fresh)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--restart", action="store_true", default=False)
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="thread")
+    parser.add_argument("--recrawl", action="store_true", default=False)
+    parser.add_argument("--record", type=str, default=None)
+    parser.add_argument("--cache_server", type=str, default=None)
+    parser.add_argument("--shards", type=int, default=1)
+    args = parser.parse_args()
+    # Exit normally on SIGTERM so the frontier flushes its pending writes.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    main(
+        args.config_file, args.restart, args.engine, args.recrawl,
+        args.record, args.cache_server, args.shards)
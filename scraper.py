@@ -1,17 +1,22 @@
 import re
-from urllib.parse import urlparse, urljoin
-from lxml import html, etree
-from collections import defaultdict
+from urllib.parse import urlparse
+from lxml import etree
+from collections import Counter
+from utils.simhash import simhash
+from utils.url_filter import UrlFilter
+from utils.canonical import canonicalize_links
+from utils.metrics import metrics
 
 '''Returns all the links found in the given URL's webpage.
-Checks each link and returns the ones that are valid.'''
-def scraper(url, resp, report_info, visited_urls_count, visited_urls_hash):
-    links = extract_next_links(url, resp, report_info, visited_urls_count, visited_urls_hash)
+Checks each link and returns the ones that are valid.
+page is the ParsedPage of resp if it was already parsed elsewhere, e.g. in a parse process.'''
+def scraper(url, resp, report_info, traps, visited_urls_hash, page=None):
+    links = extract_next_links(url, resp, report_info, traps, visited_urls_hash, page)
     return [link for link in links if is_valid(link)]
 
 
 '''Given a URL and response, extracts all the links found in the URL and stores information for the report.'''
-def extract_next_links(url, resp, report_info, visited_urls_count, visited_urls_hash):
+def extract_next_links(url, resp, report_info, traps, visited_urls_hash, page=None):
     links = []
     try:
         if resp.status == 200:
@@ -20,58 +25,42 @@ def extract_next_links(url, resp, report_info, visited_urls_count, visited_urls_
             report_info.increment_unique_page_count()
             report_info.add_unique_page(url)
 
-            if not check_similarity(url, resp, visited_urls_hash):
+            '''Only html pages are parsed; pdfs, images and other files have no links to follow.'''
+            if not is_html(resp):
                 return list()
 
-            '''Parse the current url using the `urlparse()` method of the urllib library, remove the query part, 
-            and increment the count of the visited url in the `visited_urls_count` dictionary'''
+            '''Parse the page once; links, words and fingerprint all come from that pass.'''
+            if page is None:
+                with metrics.timer("parse"):
+                    page = parse_page(url, resp.raw_response.content)
+            if page is None:
+                return list()
+            with metrics.timer("dedup"):
+                if not check_similarity(url, page, visited_urls_hash):
+                    return list()
+
+            '''Parse the current url using the `urlparse()` method of the urllib library'''
             parsed_url = urlparse(url)
-            url_without_query = parsed_url.scheme + "://" + parsed_url.netloc + parsed_url.path
-            visited_urls_count[url_without_query] += 1
 
             '''If current url is a subdomain of ics.uci.edu, increment the count of that subdomain in the report_info object'''
-            if ("ics.uci.edu" in parsed_url.netloc):
+            if (parsed_url.netloc == "ics.uci.edu" or parsed_url.netloc.endswith(".ics.uci.edu")):
                 sub_domain = parsed_url.scheme + "://" + parsed_url.netloc
                 report_info.increment_sub_domains_page_count(sub_domain)
-                
-            html_string = html.fromstring(resp.raw_response.content)
-            '''Calculate the hash value of the webpage's content and store it in the `visited_urls_hash` dictionary'''
-            url_content = html_string.text_content()
-            visited_urls_hash[url] = hash(url_content)
-            '''Extract all links from the HTML string and iterate through them'''
-            full_links = list(html_string.iterlinks())
-            for y in full_links:
-                if y != "#" and y != "/":
-                    new_url = urljoin(url, y[2])
-                    '''Remove fragment from URL if it exists'''
-                    fragment_index = new_url.find('#')
-                    if fragment_index != -1:
-                        new_url = new_url[:fragment_index]
-                    parsed_new_url = urlparse(url)
-                    new_url_without_query = parsed_new_url.scheme + "://" + parsed_new_url.netloc + parsed_new_url.path
-                    '''only adds URL to frontier if it has been crawled through under 11 times and there is not a URL inside the URL'''
-                    if visited_urls_count[new_url_without_query] < 11:
-                        if ("https" not in parsed_new_url.path) and ("http" not in parsed_new_url.path):
-                            links.append(new_url)
-
-
-            url_word_count = 0
-
-            '''Extract the text content of the webpage. Iterate through the words and increment the
-            number if times that word is found in all webpages (word_frequency) and the number of words 
-            in the current URL (url_word_count).
-            '''
-            site_text_list = html_string.xpath('//p')
-            # counts words in the URL and adds each word into the word_frequency dict in ReportInformation().
-            for body in site_text_list:
-                for word in re.split('[^a-zA-z0-9]+', body.text_content()):
-                    lowercase_word = word.lower()
-                    if lowercase_word != "":
-                        if len(lowercase_word) > 1:
-                            if not lowercase_word.isnumeric():
-                                report_info.increment_word_frequency(lowercase_word)
-                                url_word_count += 1
-        
+
+            '''Iterate through all links found in the page, already canonical: joined with the url
+            and without fragment'''
+            for new_url in page.links:
+                new_path = new_url.partition("?")[0].partition("://")[2].partition("/")[2]
+                '''only adds URL to frontier if its url pattern has fetches left in `traps`
+                (see crawler/traps.py) and there is not a URL inside the URL'''
+                if "http" not in new_path and traps.allows(new_url):
+                    links.append(new_url)
+
+            '''Increment the number of times each word of the page's paragraphs is found in
+            all webpages (word_frequency).'''
+            report_info.add_words(page.words)
+            url_word_count = page.word_count
+
             '''If the url_word_count is higher than the current max number of words in a URL, update it'''
             if url_word_count > report_info.get_max_words():
                 report_info.set_max_words_url(url, url_word_count)
@@ -79,89 +68,115 @@ def extract_next_links(url, resp, report_info, visited_urls_count, visited_urls_
     except:
         return list()
 
+HTML_CONTENT_TYPES = frozenset(("text/html", "application/xhtml+xml"))
+
+'''Returns whether resp is worth parsing. A response without a content type is
+treated as html.'''
+def is_html(resp):
+    return resp.content_type is None or resp.content_type in HTML_CONTENT_TYPES
+
+
+'''Splits text into words for the report.'''
+WORD_SPLIT = re.compile(r'[^a-zA-Z0-9]+')
+
+def tokenize(text):
+    '''Returns the lowercase words of text, skipping single characters and numbers.'''
+    return [
+        word for word in WORD_SPLIT.split(text.lower())
+        if len(word) > 1 and not word.isnumeric()]
+
+class ParsedPage(object):
+    '''Everything the scraper needs from a webpage, collected in one parse.
+    links: the distinct href/src values joined with the page url and canonicalized,
+    words: the words inside <p> elements, word_count: the number of those words,
+    fingerprint: SimHash of the words of the whole text.'''
+    def __init__(self, links, words, fingerprint):
+        self.links = links
+        self.words = words
+        self.word_count = len(words)
+        self.fingerprint = fingerprint
+
+    def compact(self):
+        '''Replaces the word list by word counts, which are smaller to send
+        from a parse process; add_words accepts both.'''
+        self.words = Counter(self.words)
+        return self
+
+class PageTarget(object):
+    '''lxml parser target that collects links, text and paragraph text while the
+    page is being parsed, so no tree is built or walked afterwards.'''
+    def __init__(self, url):
+        self.url = url
+        self.links = []
+        self.text = []
+        self.paragraph_text = []
+        self.paragraph_depth = 0
+
+    def start(self, tag, attrib):
+        link = attrib.get("href") or attrib.get("src")
+        if link:
+            self.links.append(link.strip())
+        if tag == "p":
+            self.paragraph_depth += 1
+
+    def end(self, tag):
+        if tag == "p" and self.paragraph_depth:
+            self.paragraph_depth -= 1
+            self.paragraph_text.append(" ")
+
+    def data(self, data):
+        self.text.append(data)
+        if self.paragraph_depth:
+            self.paragraph_text.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        '''Links to the site's root ("/") are skipped; the others are joined with
+        the url and canonicalized together.'''
+        links = canonicalize_links(self.url, [link for link in self.links if link != "/"])
+        return ParsedPage(
+            links, tokenize("".join(self.paragraph_text)),
+            simhash(tokenize("".join(self.text))))
+
+'''Parses the content of the webpage at url in a single pass.
+Returns a ParsedPage, or None if the page is empty.'''
+def parse_page(url, content):
+    if not content or not content.strip():
+        return None
+    parser = etree.HTMLParser(target=PageTarget(url))
+    return etree.fromstring(content, parser)
+
+'''parse_page for a parse process: returns a ParsedPage with word counts,
+or None if the page is empty.'''
+def parse_page_compact(url, content):
+    page = parse_page(url, content)
+    return page.compact() if page is not None else None
+
 '''
 Function that checks whether the content of a webpage located at the given url 
 is similar or nearly identical to any previously visited webpages, based 
 on a similarity threshold.
+visited_urls_hash is a SimHashIndex; if no stored fingerprint is within its
+threshold, the page's fingerprint is added and the function returns True.
+It returns False if the current webpage is too similar to a previously visited webpage.
 '''
-def check_similarity(url, resp, visited_urls_hash):
-    try:
-        threshold = 0.0
-        content = resp.raw_response.content
-        parsed_content = html.fromstring(content)
-        url_content = parsed_content.text_content()
-        '''
-        If the absolute difference is less than or equal to the similarity threshold,
-        function returns False which shows that the current webpage is too similar
-        to a previously visited webpage
-        '''
-        for page_hash in visited_urls_hash.values():
-            is_similar = abs(hash(url_content) - page_hash)
-            if (is_similar <= threshold):
-                return False
-        return True
-
-    except etree.ParserError:
-        '''If the page content is empty, return False'''
-        return False
-    except AttributeError:
-        '''If the hash cannot be retrieved, return False'''
-        return False
+def check_similarity(url, page, visited_urls_hash):
+    return visited_urls_hash.add_if_unique(page.fingerprint)
 
 '''Function called from the scraper function of scraper.py in order to 
 determine whether a URL should be crawled
-Returns True if the URL should be crawled or False if not'''
+Returns True if the URL should be crawled or False if not.
+The rules live in url_filter, a utils.url_filter.UrlFilter built once from the
+[CRAWLER] section of config.ini by set_url_filter.'''
 def is_valid(url):
-    try:
-        '''check if the scheme contains http or https'''
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        
-        
-        '''Check for traps with infinite repeating paths.
-        Split the parsed URLs path by the "/" character and count the
-        occurances of each path segment using path_count, a default dictionary
-        If any path segment appears more than once, return False'''
-        path_count = defaultdict(int)
-        path_words = parsed.path.split("/")
-        for x in path_words:
-            path_count[x] += 1
-        for count in path_count.values():
-            if count > 1:
-                return False
-
-        '''Check if the parsed URL's netloc includes ".[ics, cs, informatics, stat].uci.edu"
-        Split the netloc by the "." character and find the index of "uci" in the resulting list
-        If the element before "uci" is not in the set of valid subdomains, return False.'''
-        # parsed.netloc must include ".[ics, cs, informatics, stat].uci.edu"
-        split_netloc = parsed.netloc.split(".")
-        affiliate_index = split_netloc.index("uci")
-        if split_netloc[affiliate_index-1] not in set(["ics", "cs", "informatics", "stat"]):
-            return False
-        
-        '''Check if the element after "uci" is "edu".
-        If not, return False.'''
-        if split_netloc[affiliate_index+1] != "edu":
-            return False
-        
-        
-        '''Use regex to match the URL's path against a list of excluded file typessuch as images and executables.
-        If the path matches the regular expression, return False. Otherwise, return True.'''
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
-
-    except TypeError:
-        '''If the URL could not be parsed correctly, return False'''
-        print ("TypeError for ", parsed)
-        return False
-    except ValueError:
-        '''If 'uci' could not be found in the netloc, return False'''
-        return False
+    return url_filter.is_valid(url)
+
+
+url_filter = UrlFilter()
+
+'''Replaces url_filter with one that applies the rules of config.'''
+def set_url_filter(config):
+    global url_filter
+    url_filter = UrlFilter.from_config(config)
@@ -1,35 +1,63 @@
 import os
+import atexit
 import logging
 from hashlib import sha256
+from queue import SimpleQueue
+from threading import RLock
+from logging.handlers import QueueHandler, QueueListener
 from urllib.parse import urlparse
 
+from utils.canonical import canonicalize
+
+# One queue and listener thread per log file. Loggers only put records on the
+# queue, so a worker never waits for the file or the terminal.
+_log_queues = dict()
+_log_lock = RLock()
+
+def _log_queue(filename):
+    with _log_lock:
+        queue = _log_queues.get(filename)
+        if queue is None:
+            if not os.path.exists("Logs"):
+                os.makedirs("Logs")
+            fh = logging.FileHandler(f"Logs/{filename}.log")
+            fh.setLevel(logging.DEBUG)
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.INFO)
+            formatter = logging.Formatter(
+               "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+            fh.setFormatter(formatter)
+            ch.setFormatter(formatter)
+            queue = _log_queues[filename] = SimpleQueue()
+            listener = QueueListener(queue, fh, ch, respect_handler_level=True)
+            listener.start()
+            # Writes out the records still queued when the crawler exits.
+            atexit.register(listener.stop)
+        return queue
+
 def get_logger(name, filename=None):
+    '''Returns the logger name, writing to Logs/<filename or name>.log and to
+    the terminal. Calling it again for the same name adds no more handlers.'''
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    if not os.path.exists("Logs"):
-        os.makedirs("Logs")
-    fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
-    fh.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-       "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(formatter)
-    ch.setFormatter(formatter)
-    # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+    with _log_lock:
+        if not logger.handlers:
+            logger.setLevel(logging.INFO)
+            logger.addHandler(QueueHandler(_log_queue(filename if filename else name)))
     return logger
 
 
 def get_urlhash(url):
-    parsed = urlparse(url)
+    parsed = urlparse(canonicalize(url))
     # everything other than scheme.
     return sha256(
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
         f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
 
+def get_seen_key(url):
+    '''Cheap in-memory key for the canonical url. Like get_urlhash it ignores
+    the scheme, but it skips parsing and hashing the url.'''
+    return url.partition("://")[2] or url
+
 def normalize(url):
-    if url.endswith("/"):
-        return url.rstrip("/")
-    return url
+    '''Returns the canonical form of url, see utils.canonical.canonicalize.'''
+    return canonicalize(url)
@@ -0,0 +1,92 @@
+import asyncio
+
+from urllib.parse import urlencode
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class AsyncCacheClient(object):
+    '''Downloads urls through the cache server from an asyncio event loop.
+    It speaks just enough HTTP/1.1 for the cache server, keeping idle
+    connections open for reuse, so an in-flight download costs one coroutine
+    and one socket rather than one thread. Bodies are returned undecoded.'''
+    def __init__(self, config):
+        self.config = config
+        self.host, self.port = config.cache_server
+        self.idle = list()
+
+    async def download(self, url):
+        '''Returns (status code, body) of the cache server's answer for url.
+        Connection errors and 5xx answers are retried like utils.download.'''
+        path = "/?" + urlencode([("q", url), ("u", self.config.user_agent)])
+        attempt = 0
+        while True:
+            try:
+                status, body = await asyncio.wait_for(
+                    self._request(path), self.config.connect_timeout + self.config.read_timeout)
+                if status not in RETRY_STATUSES or attempt >= self.config.retries:
+                    return status, body
+            except (OSError, EOFError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                if attempt >= self.config.retries:
+                    raise
+            attempt += 1
+            if attempt > 1:
+                await asyncio.sleep(self.config.retry_backoff * 2 ** (attempt - 1))
+
+    async def _connection(self):
+        if self.idle:
+            return self.idle.pop()
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.config.connect_timeout)
+
+    async def _request(self, path):
+        reader, writer = await self._connection()
+        try:
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Connection: keep-alive\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise EOFError("Connection closed by the cache server.")
+            status = int(status_line.split()[1])
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close"
+            if "content-length" in headers:
+                body = await reader.readexactly(int(headers["content-length"]))
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                body = await self._read_chunked(reader)
+            else:
+                body = await reader.read()
+                keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return status, body
+
+    async def _read_chunked(self, reader):
+        chunks = list()
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip the trailers.
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = list()
@@ -0,0 +1,43 @@
+import math
+
+
+class BloomFilter(object):
+    '''Fixed-size Bloom filter over strings. It is sized for `capacity` keys at
+    the given false positive rate, so its memory does not grow with the number
+    of keys. Keys are hashed with Python's built-in string hash, which is cheap
+    and cached on the string, but differs between processes: the filter is
+    only kept in memory and rebuilt from the save file on resume.'''
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        '''Adds key and returns True if it was probably added before, or False
+        if it was definitely new.'''
+        bits = self.bits
+        seen = True
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                seen = False
+        if not seen:
+            self.count += 1
+        return seen
+
+    def is_full(self):
+        return self.count > self.capacity
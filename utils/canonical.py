@@ -0,0 +1,138 @@
+import re
+
+from functools import lru_cache
+from urllib.parse import urlsplit, urljoin
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# Query parameters that only record where a visitor came from; the page is
+# the same without them.
+TRACKING_PARAMS = frozenset((
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi"))
+TRACKING_PREFIXES = ("utm_",)
+
+PERCENT_ESCAPE = re.compile(r"%[0-9A-Fa-f]{2}")
+UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _normalize_escape(match):
+    char = chr(int(match.group()[1:], 16))
+    return char if char in UNRESERVED else match.group().upper()
+
+
+@lru_cache(maxsize=1 << 14)
+def canonical_netloc(scheme, netloc):
+    '''Lowercases the host and drops a trailing dot and the default port.'''
+    userinfo, at, hostport = netloc.rpartition("@")
+    if hostport.startswith("["):
+        host, bracket, port = hostport.partition("]")
+        host += bracket
+        port = port[1:]
+    else:
+        host, _, port = hostport.partition(":")
+    host = host.lower().rstrip(".")
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    return userinfo + at + host
+
+
+def remove_dot_segments(path):
+    '''Resolves "." and ".." segments of an absolute path (RFC 3986 5.2.4).'''
+    if "." not in path:
+        return path
+    segments = path.split("/")
+    output = []
+    for segment in segments:
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        output.append("")
+    return "/".join(output)
+
+
+def canonical_query(query):
+    '''Drops empty and tracking parameters and sorts the others. Parameters
+    are compared as they are written, without decoding them.'''
+    params = [
+        param for param in query.split("&")
+        if param and not _is_tracking(param.partition("=")[0].lower())]
+    params.sort()
+    return "&".join(params)
+
+
+def _is_tracking(key):
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def _join(scheme, netloc, path, query):
+    if "%" in path:
+        path = PERCENT_ESCAPE.sub(_normalize_escape, path)
+    path = remove_dot_segments(path).rstrip("/")
+    if query:
+        if "%" in query:
+            query = PERCENT_ESCAPE.sub(_normalize_escape, query)
+        query = canonical_query(query)
+    if query:
+        return f"{scheme}://{netloc}{path}?{query}"
+    return f"{scheme}://{netloc}{path}"
+
+
+def canonicalize(url):
+    '''Returns the canonical form of an absolute http(s) url: lower case
+    scheme and host, no default port, no "." or ".." segments, no trailing
+    slash, upper case percent escapes except for unreserved characters,
+    which are decoded, sorted query parameters without tracking ones, and no
+    fragment. Urls of other schemes are only stripped of their fragment.'''
+    scheme, netloc, path, query, _ = urlsplit(url.strip())
+    if scheme not in DEFAULT_PORTS:
+        return url.strip().partition("#")[0]
+    return _join(scheme, canonical_netloc(scheme, netloc), path, query)
+
+
+def canonicalize_links(base_url, links):
+    '''Joins every link of a page with the page's url base_url, like urljoin,
+    and returns the distinct canonical urls in order. base_url is split once
+    and the common link forms are joined without parsing them; links that
+    are empty or only a fragment point back to the page and are left out.'''
+    base_scheme, base_netloc, base_path, _, _ = urlsplit(base_url)
+    if base_scheme not in DEFAULT_PORTS:
+        return list(dict.fromkeys(
+            canonicalize(urljoin(base_url, link)) for link in links
+            if link.strip().partition("#")[0]))
+    base_netloc = canonical_netloc(base_scheme, base_netloc)
+    directory = base_path[:base_path.rfind("/") + 1] or "/"
+    canonical = dict()
+    for link in links:
+        link = link.strip().partition("#")[0]
+        if not link:
+            continue
+        if link.startswith(("http://", "https://")):
+            url = canonicalize(link)
+        elif not (link.isascii() and link.isprintable()) or ";" in link or link.startswith("//"):
+            # Left to urljoin: ;params, //host links and links that it
+            # cleans up first.
+            url = canonicalize(urljoin(base_url, link))
+        elif link.startswith("/"):
+            path, _, query = link.partition("?")
+            url = _join(base_scheme, base_netloc, path, query)
+        elif link.startswith("?"):
+            url = _join(base_scheme, base_netloc, base_path, link[1:])
+        elif ":" in link.partition("/")[0].partition("?")[0]:
+            # Another scheme, like mailto: or javascript:
+            url = canonicalize(urljoin(base_url, link))
+        else:
+            path, _, query = link.partition("?")
+            path = directory + path
+            if "//" in path:
+                # urljoin drops empty segments when merging relative paths.
+                segments = path.split("/")
+                segments[1:-1] = filter(None, segments[1:-1])
+                path = "/".join(segments)
+            url = _join(base_scheme, base_netloc, path, query)
+        canonical[url] = None
+    return list(canonical)
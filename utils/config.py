@@ -1,6 +1,10 @@
 import re
 
 
+def split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
 class Config(object):
     def __init__(self, config):
         self.user_agent = config["IDENTIFICATION"]["USERAGENT"].strip()
@@ -8,12 +12,38 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.async_concurrency = int(config["LOCAL PROPERTIES"].get("ASYNC_CONCURRENCY", 200))
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSE_PROCESSES", 0))
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.store = config["LOCAL PROPERTIES"].get("STORE", "shelve").strip().lower()
+        assert self.store in ("shelve", "sqlite"), "STORE should be shelve or sqlite"
+        self.save_batch = int(config["LOCAL PROPERTIES"].get("SAVE_BATCH", 1000))
+        self.save_interval = float(config["LOCAL PROPERTIES"].get("SAVE_INTERVAL", 5))
+        self.seen_filter_capacity = int(config["LOCAL PROPERTIES"].get("SEEN_FILTER_CAPACITY", 2000000))
+        self.seen_filter_error = float(config["LOCAL PROPERTIES"].get("SEEN_FILTER_ERROR", 0.0001))
+        self.word_memory_limit = int(config["LOCAL PROPERTIES"].get("WORD_MEMORY_LIMIT", 100000))
+        self.word_count_mode = config["LOCAL PROPERTIES"].get("WORD_COUNT_MODE", "exact").strip().lower()
+        assert self.word_count_mode in ("exact", "approximate"), "WORD_COUNT_MODE should be exact or approximate"
+        self.stats_interval = float(config["LOCAL PROPERTIES"].get("STATS_INTERVAL", 60))
+        self.page_cache = config["LOCAL PROPERTIES"].get("PAGE_CACHE", "").strip()
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICS_PORT", 0))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.connect_timeout = float(config["CONNECTION"].get("CONNECT_TIMEOUT", 5))
+        self.read_timeout = float(config["CONNECTION"].get("READ_TIMEOUT", 60))
+        self.retries = int(config["CONNECTION"].get("RETRIES", 3))
+        self.retry_backoff = float(config["CONNECTION"].get("RETRY_BACKOFF", 0.5))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.simhash_threshold = int(config["CRAWLER"].get("SIMHASH_THRESHOLD", 3))
+        self.trap_budget = int(config["CRAWLER"].get("TRAP_BUDGET", 50))
+        self.trap_shrink = float(config["CRAWLER"].get("TRAP_SHRINK", 0.9))
+        self.scorer = config["CRAWLER"].get("SCORER", "crawler.scoring.UrlScorer").strip()
+        self.allowed_domains = split_list(config["CRAWLER"].get(
+            "ALLOWED_DOMAINS", "ics.uci.edu,cs.uci.edu,informatics.uci.edu,stat.uci.edu"))
+        self.blocked_extensions = split_list(config["CRAWLER"].get("BLOCKED_EXTENSIONS", ""))
+        self.blocked_paths = split_list(config["CRAWLER"].get("BLOCKED_PATHS", ""))
 
         self.cache_server = None
\ No newline at end of file
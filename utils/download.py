@@ -2,20 +2,70 @@ import requests
 import cbor
 import time
 
+from threading import local
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from utils.response import Response
+from utils.page_cache import get_page_cache
+from utils.metrics import metrics
+
+# One session per thread, so every worker keeps its connection to the cache
+# server alive instead of opening a new one per download.
+_sessions = local()
+
+def get_session(config):
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        retry = Retry(
+            total=config.retries, backoff_factor=config.retry_backoff,
+            status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _sessions.session = session
+    return session
 
 def download(url, config, logger=None):
+    page_cache = get_page_cache(config)
+    if page_cache is not None:
+        cached = page_cache.get(url)
+        if cached is not None:
+            metrics.count("page_cache_hits")
+            return decode_response(url, *cached, logger)
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        with metrics.timer("download"):
+            resp = get_session(config).get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+                timeout=(config.connect_timeout, config.read_timeout))
+    except requests.RequestException as e:
+        # The cache server could not be reached, even after retrying.
+        metrics.count("download_errors")
+        if logger:
+            logger.error(f"Spacetime request error {e} with url {url}.")
+        return Response({
+            "error": f"Spacetime request error {e} with url {url}.",
+            "status": 600,
+            "url": url})
+    decoded = decode_response(url, resp.status_code, resp.content, logger)
+    if page_cache is not None:
+        page_cache.add_response(url, resp.status_code, resp.content, decoded)
+    return decoded
+
+def decode_response(url, status_code, content, logger=None):
+    '''Builds the Response for url from the cache server's HTTP status and body.'''
+    try:
+        if 200 <= status_code < 400 and content:
+            with metrics.timer("decode"):
+                return Response(cbor.loads(content))
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if logger:
+        logger.error(f"Spacetime Response error <{status_code}> with url {url}.")
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": f"Spacetime Response error <{status_code}> with url {url}.",
+        "status": status_code,
         "url": url})
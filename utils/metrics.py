@@ -0,0 +1,160 @@
+import json
+import math
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, RLock, local
+
+# Timer histograms have this many buckets per power of two of microseconds,
+# so percentiles are at most 25% above the real value.
+SUB_BUCKETS = 4
+
+
+def bucket(seconds):
+    '''Returns the histogram bucket of a duration.'''
+    mantissa, exponent = math.frexp(max(seconds * 1e6, 1.0))
+    return exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+
+def bucket_bound(index):
+    '''Returns the upper bound, in seconds, of the durations in bucket index.'''
+    exponent, sub_bucket = divmod(index, SUB_BUCKETS)
+    return (0.5 + (sub_bucket + 1) / (2 * SUB_BUCKETS)) * 2 ** exponent / 1e6
+
+
+class MetricsShard(object):
+    '''The counters and timers of one thread. Only that thread writes to them,
+    so updates take no lock.'''
+    def __init__(self):
+        self.counters = dict()
+        # name -> [count, total seconds, max seconds, {bucket: count}]
+        self.timers = dict()
+
+
+class Timer(object):
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics(object):
+    '''Counters and timers of the hot paths of the crawl: download, decode,
+    parse, dedup, frontier add and save file writes. Like CrawlStats, every
+    thread updates its own shard and snapshot() merges them, so measuring
+    costs a dict update and no lock on the crawl's threads.'''
+    def __init__(self):
+        self.local = local()
+        self.shards = list()
+        self.lock = RLock()
+        self.started = time.time()
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = MetricsShard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def count(self, name, amount=1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        timers = self._shard().timers
+        timer = timers.get(name)
+        if timer is None:
+            timer = timers[name] = [0, 0.0, 0.0, dict()]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+        histogram = timer[3]
+        index = bucket(seconds)
+        histogram[index] = histogram.get(index, 0) + 1
+
+    def timer(self, name):
+        '''Returns a context manager that observes the seconds its block takes.'''
+        return Timer(self, name)
+
+    def snapshot(self):
+        '''Returns the counters, and the count, total, mean, max, p50 and p99 in
+        seconds of every timer, of all threads so far.'''
+        with self.lock:
+            shards = list(self.shards)
+        counters = dict()
+        timers = dict()
+        for shard in shards:
+            for name, value in dict(shard.counters).items():
+                counters[name] = counters.get(name, 0) + value
+            for name, (count, total, longest, histogram) in dict(shard.timers).items():
+                merged = timers.setdefault(name, [0, 0.0, 0.0, dict()])
+                merged[0] += count
+                merged[1] += total
+                merged[2] = max(merged[2], longest)
+                for index, bucket_count in dict(histogram).items():
+                    merged[3][index] = merged[3].get(index, 0) + bucket_count
+        return {
+            "uptime": time.time() - self.started,
+            "counters": dict(sorted(counters.items())),
+            "timers": {
+                name: {
+                    "count": count, "total": total, "mean": total / count if count else 0.0,
+                    "max": longest, "p50": percentile(histogram, count, 0.5),
+                    "p99": percentile(histogram, count, 0.99)}
+                for name, (count, total, longest, histogram) in sorted(timers.items())}}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.snapshot(), metrics_file, indent=1)
+
+
+def percentile(histogram, count, fraction):
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= fraction * count:
+            return bucket_bound(index)
+    return 0.0
+
+
+# The metrics of this process.
+metrics = Metrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(metrics.snapshot(), indent=1).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = RLock()
+
+
+def start_metrics_server(config):
+    '''Serves the metrics snapshot as json on http://127.0.0.1:METRICS_PORT/
+    from a daemon thread, once per process. Does nothing if METRICS_PORT is 0.'''
+    global _server
+    if config.metrics_port <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("127.0.0.1", config.metrics_port), MetricsHandler)
+            _server.daemon_threads = True
+            Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import mmap
+import zlib
+
+from hashlib import sha256
+from threading import RLock
+
+from utils.response import get_header
+
+# Files of a page cache directory.
+DATA = "pages.dat"
+INDEX = "index.log"
+# Page cache directories of the shards of a sharded crawl, inside PAGE_CACHE.
+SHARD_DIR = re.compile(r"shard\d+")
+
+_caches = dict()
+_caches_lock = RLock()
+
+
+def get_page_cache(config):
+    '''Returns the PageCache in the PAGE_CACHE directory, opened once per
+    process, or None if PAGE_CACHE is not set.'''
+    if not config.page_cache:
+        return None
+    with _caches_lock:
+        cache = _caches.get(config.page_cache)
+        if cache is None:
+            cache = _caches[config.page_cache] = PageCache(config.page_cache)
+        return cache
+
+
+def close_page_caches():
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
+
+
+class PageCache(object):
+    '''Local copy of the cache server's answers, so a restarted crawl reads
+    the pages it already downloaded from disk, and recrawl mode can run them
+    through the scraper again without any network.
+
+    Bodies are stored once per content hash, zlib compressed, in an
+    append-only data file that is read through mmap. The index is an
+    append-only log of json lines, one per downloaded url, with the status,
+    the ETag and Last-Modified headers of the page, the content hash and
+    where its body is in the data file; it is read into a dict on open, and
+    the last line of a url wins. A line is only written after its body, so
+    a crash leaves at most a body without a line.'''
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.data_path = os.path.join(path, DATA)
+        self.index_path = os.path.join(path, INDEX)
+        # url -> {"status", "digest", "offset", "length", "etag", "last_modified"}
+        self.index = dict()
+        # content hash -> (offset, length)
+        self.blobs = dict()
+        self.lock = RLock()
+        self.data = open(self.data_path, "ab")
+        self.data_size = self.data.tell()
+        self.map = None
+        self._load_index()
+        self.index_log = open(self.index_path, "a", encoding="utf-8")
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding="utf-8") as index_log:
+            for line in index_log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Cut off by a crash.
+                    continue
+                if entry["offset"] + entry["length"] > self.data_size:
+                    continue
+                self.index[entry.pop("url")] = entry
+                self.blobs[entry["digest"]] = (entry["offset"], entry["length"])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def _read(self, offset, length):
+        with self.lock:
+            if self.map is None or len(self.map) < offset + length:
+                # Mapped again once the file grew past the mapped size. The old
+                # map is left to the garbage collector, since other threads
+                # may still be reading from it.
+                self.data.flush()
+                with open(self.data_path, "rb") as data:
+                    self.map = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+            data_map = self.map
+        return zlib.decompress(data_map[offset:offset + length])
+
+    def get(self, url):
+        '''Returns (status code, body) of the cache server's answer for url, or
+        None if url is not cached.'''
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        return entry["status"], self._read(entry["offset"], entry["length"])
+
+    def put(self, url, status_code, body, etag=None, last_modified=None):
+        digest = sha256(body).hexdigest()
+        with self.lock:
+            blob = self.blobs.get(digest)
+            if blob is None:
+                compressed = zlib.compress(body)
+                blob = self.blobs[digest] = (self.data_size, len(compressed))
+                self.data.write(compressed)
+                self.data.flush()
+                self.data_size += len(compressed)
+            entry = {
+                "status": status_code, "digest": digest, "offset": blob[0],
+                "length": blob[1], "etag": etag, "last_modified": last_modified}
+            self.index_log.write(json.dumps(dict(entry, url=url)) + "\n")
+            self.index_log.flush()
+            self.index[url] = entry
+
+    def add_response(self, url, status_code, body, resp):
+        '''Caches the cache server's answer for url if it was decoded into resp
+        and is worth keeping; failed downloads and server errors are tried
+        again next time.'''
+        if resp.error is not None or resp.status >= 500 or not body:
+            return
+        self.put(
+            url, status_code, body, get_header(resp.raw_response, "ETag"),
+            get_header(resp.raw_response, "Last-Modified"))
+
+    def pages(self):
+        '''Yields (url, status code, body) of every cached url, in the order
+        they were first downloaded.'''
+        for url, entry in list(self.index.items()):
+            yield url, entry["status"], self._read(entry["offset"], entry["length"])
+
+    def close(self):
+        with self.lock:
+            self.data.close()
+            self.index_log.close()
+            self.map = None
+
+
+class PageArchive(object):
+    '''The pages of a page cache directory together with those of the
+    shard<i> directories a sharded crawl writes inside it, for replaying and
+    recrawling them. A url is looked up in each cache in turn.'''
+    def __init__(self, path):
+        shard_paths = sorted(
+            os.path.join(path, name) for name in
+            (os.listdir(path) if os.path.isdir(path) else ())
+            if SHARD_DIR.fullmatch(name) and os.path.isdir(os.path.join(path, name)))
+        paths = shard_paths
+        if not shard_paths or os.path.exists(os.path.join(path, INDEX)):
+            paths = [path] + shard_paths
+        self.caches = [PageCache(cache_path) for cache_path in paths]
+
+    def __len__(self):
+        return sum(len(cache) for cache in self.caches)
+
+    def __contains__(self, url):
+        return any(url in cache for cache in self.caches)
+
+    def get(self, url):
+        for cache in self.caches:
+            cached = cache.get(url)
+            if cached is not None:
+                return cached
+        return None
+
+    def pages(self):
+        for cache in self.caches:
+            yield from cache.pages()
+
+    def close(self):
+        for cache in self.caches:
+            cache.close()
@@ -0,0 +1,80 @@
+'''Stand-in for the cache server that answers from a page cache recorded with
+launch.py --record, so the crawler can be run and measured without the
+spacetime servers:
+
+    python -m utils.replay_server --archive pages --port 9000 --latency 0.05
+    python3 launch.py --cache_server 127.0.0.1:9000
+'''
+import time
+import random
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+
+from utils.page_cache import PageArchive
+
+
+def make_handler(archive, latency, jitter):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        '''Answers every request with the recorded cbor body of its url after
+        latency seconds, plus up to jitter more, or with an empty 404 if the
+        url was not recorded.'''
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+            if latency or jitter:
+                time.sleep(latency + random.uniform(0, jitter))
+            recorded = archive.get(url)
+            status, body = recorded if recorded is not None else (404, b"")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return ReplayHandler
+
+
+class ReplayServer(object):
+    '''Serves the page cache in archive, including the caches of its shards,
+    from a thread of this process.'''
+    def __init__(self, archive, latency=0.0, jitter=0.0, host="127.0.0.1", port=0):
+        self.archive = PageArchive(archive)
+        self.server = ThreadingHTTPServer(
+            (host, port), make_handler(self.archive, latency, jitter))
+        self.server.daemon_threads = True
+
+    @property
+    def address(self):
+        '''The (host, port) to use as the config's cache_server.'''
+        return self.server.server_address[:2]
+
+    def start(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.archive.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--archive", type=str, required=True)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+    replay = ReplayServer(args.archive, args.latency, args.jitter, args.host, args.port)
+    print(f"Replaying {len(replay.archive)} pages on {replay.address[0]}:{replay.address[1]}.")
+    try:
+        replay.server.serve_forever()
+    except KeyboardInterrupt:
+        replay.stop()
@@ -1,5 +1,24 @@
 import pickle
 
+
+def get_header(raw_response, name):
+    '''Returns the value of header name of the requests.Response raw_response,
+    or None if it has none.'''
+    headers = getattr(raw_response, "headers", None)
+    if headers is None:
+        return None
+    return headers.get(name)
+
+
+def get_content_type(raw_response):
+    '''Returns the lower case media type of raw_response, without parameters,
+    or None if it has none.'''
+    content_type = get_header(raw_response, "Content-Type")
+    if not isinstance(content_type, str):
+        return None
+    return content_type.partition(";")[0].strip().lower() or None
+
+
 class Response(object):
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
@@ -12,3 +31,4 @@ class Response(object):
                 None)
         except TypeError:
             self.raw_response = None
+        self.content_type = get_content_type(self.raw_response)
@@ -1,8 +1,9 @@
-import os
-from spacetime import Node
-from utils.pcc_models import Register
+# spacetime and rtypes are only imported once the crawler registers, so the
+# rest of the crawler, including --recrawl and a stand-in cache server, starts
+# without them.
 
 def init(df, user_agent, fresh):
+    from utils.pcc_models import Register
     reg = df.read_one(Register, user_agent)
     if not reg:
         reg = Register(user_agent, fresh)
@@ -19,8 +20,11 @@ def init(df, user_agent, fresh):
             df.push()
     return reg.load_balancer
 
-def get_cache_server(config, restart):
+def get_cache_server(config, fresh):
+    '''Registers with the cache server and returns its address. fresh tells
+    it whether the crawl starts over or resumes a save file.'''
+    from spacetime import Node
+    from utils.pcc_models import Register
     init_node = Node(
         init, Types=[Register], dataframe=(config.host, config.port))
-    return init_node.start(
-        config.user_agent, restart or not os.path.exists(config.save_file))
\ No newline at end of file
+    return init_node.start(config.user_agent, fresh)
\ No newline at end of file
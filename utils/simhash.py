@@ -0,0 +1,98 @@
+from array import array
+from functools import lru_cache
+from hashlib import blake2b
+from threading import RLock
+
+FINGERPRINT_BITS = 64
+# Each bit of a token hash gets its own 32 bit lane in one big integer, so the
+# per-bit counts of all token hashes are a single addition per token.
+LANE_BITS = 32
+LANE_MASK = (1 << LANE_BITS) - 1
+
+
+@lru_cache(maxsize=1 << 18)
+def _token_lanes(token):
+    '''Stable 64 bit hash of token, with bit i moved to lane i.'''
+    h = int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    lanes = 0
+    for i in range(FINGERPRINT_BITS):
+        if h >> i & 1:
+            lanes |= 1 << (i * LANE_BITS)
+    return lanes
+
+
+def simhash(tokens):
+    '''64 bit SimHash of a list of tokens, weighted by how often each appears.
+    Token hashes use blake2b, so fingerprints are the same in every process.'''
+    total = len(tokens)
+    lanes = sum(map(_token_lanes, tokens))
+    fingerprint = 0
+    for i in range(FINGERPRINT_BITS):
+        # Bit i is set if more than half of the weight has it set.
+        if 2 * ((lanes >> (i * LANE_BITS)) & LANE_MASK) > total:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex(object):
+    '''Finds fingerprints within `threshold` bits of a given fingerprint without
+    comparing against every stored one. Fingerprints are split into
+    threshold + 1 blocks; two fingerprints that differ in at most `threshold`
+    bits must agree exactly on at least one block, so only fingerprints sharing
+    a block value are compared.'''
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        self.block_count = threshold + 1
+        self.block_bits = -(-FINGERPRINT_BITS // self.block_count)
+        self.block_mask = (1 << self.block_bits) - 1
+        self.tables = [dict() for _ in range(self.block_count)]
+        self.fingerprints = array("Q")
+        self.lock = RLock()
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def _blocks(self, fingerprint):
+        return [
+            (fingerprint >> (i * self.block_bits)) & self.block_mask
+            for i in range(self.block_count)]
+
+    def find_near(self, fingerprint):
+        '''Returns a stored fingerprint within the threshold, or None.'''
+        with self.lock:
+            for table, block in zip(self.tables, self._blocks(fingerprint)):
+                for candidate in table.get(block, ()):
+                    if hamming_distance(fingerprint, candidate) <= self.threshold:
+                        return candidate
+        return None
+
+    def add(self, fingerprint):
+        with self.lock:
+            for table, block in zip(self.tables, self._blocks(fingerprint)):
+                table.setdefault(block, []).append(fingerprint)
+            self.fingerprints.append(fingerprint)
+
+    def add_if_unique(self, fingerprint):
+        '''Adds fingerprint and returns True, unless a near-duplicate is stored,
+        in which case it returns False.'''
+        with self.lock:
+            if self.find_near(fingerprint) is not None:
+                return False
+            self.add(fingerprint)
+            return True
+
+    def dump(self, path):
+        with self.lock:
+            with open(path, "wb") as dump_file:
+                self.fingerprints.tofile(dump_file)
+
+    def load(self, path):
+        loaded = array("Q")
+        with open(path, "rb") as dump_file:
+            loaded.frombytes(dump_file.read())
+        for fingerprint in loaded:
+            self.add(fingerprint)